@@ -0,0 +1,275 @@
+import cProfile
+import io
+import json
+import math
+import os
+import pstats
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+# Histogram buckets grow geometrically so that every recorded value lands in a
+# bucket whose width is ~4% of its magnitude, regardless of whether we are
+# timing a 50us regex or a 30s LLM call. Recording is a log + dict increment.
+BUCKETS_PER_OCTAVE = 16
+_LOG_BASE = math.log(2) / BUCKETS_PER_OCTAVE
+
+# Comma separated stage names (or "all") to run under cProfile / tracemalloc,
+# e.g. PIPELINE_PROFILE=parse,extract PIPELINE_TRACEMALLOC=all
+PROFILE_ENV = 'PIPELINE_PROFILE'
+TRACEMALLOC_ENV = 'PIPELINE_TRACEMALLOC'
+REPORT_DIR_ENV = 'PIPELINE_REPORT_DIR'
+
+
+def _stages_from_env(var: str) -> set:
+    value = os.getenv(var, '')
+    return {stage.strip() for stage in value.split(',') if stage.strip()}
+
+
+class Histogram:
+    """
+    Log-bucketed histogram with cheap inserts and approximate percentiles.
+    Negative values (e.g. a latency saving that turned out to be a loss) are
+    bucketed by magnitude separately, so percentiles keep their sign.
+    """
+
+    __slots__ = ('count', 'total', 'min', 'max', 'zeros', 'buckets', 'negative_buckets')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.zeros = 0
+        self.buckets: Dict[int, int] = {}
+        self.negative_buckets: Dict[int, int] = {}
+
+    def record(self, value: float):
+        self.count += 1
+        self.total += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        if value == 0:
+            self.zeros += 1
+            return
+        buckets = self.buckets if value > 0 else self.negative_buckets
+        index = math.floor(math.log(abs(value)) / _LOG_BASE)
+        buckets[index] = buckets.get(index, 0) + 1
+
+    def percentile(self, q: float) -> Optional[float]:
+        """
+        Returns the approximate value at quantile q (0-100), clamped to the
+        observed min/max, or None if nothing has been recorded.
+        """
+        if self.count == 0:
+            return None
+        rank = max(1, math.ceil(q / 100 * self.count))
+        # Ascending value order: largest negative magnitudes first, then zeros
+        seen = 0
+        for index in sorted(self.negative_buckets, reverse=True):
+            seen += self.negative_buckets[index]
+            if seen >= rank:
+                return min(max(-self._midpoint(index), self.min), self.max)
+        seen += self.zeros
+        if seen >= rank:
+            return 0.0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= rank:
+                return min(max(self._midpoint(index), self.min), self.max)
+        return self.max
+
+    @staticmethod
+    def _midpoint(index: int) -> float:
+        # Geometric midpoint of [base^i, base^(i+1))
+        return math.exp((index + 0.5) * _LOG_BASE)
+
+    def summary(self) -> dict:
+        if self.count == 0:
+            return {'count': 0}
+        return {
+            'count': self.count,
+            'total': self.total,
+            'mean': self.total / self.count,
+            'min': self.min,
+            'max': self.max,
+            'p50': self.percentile(50),
+            'p95': self.percentile(95),
+            'p99': self.percentile(99),
+        }
+
+
+class Instrumentation:
+    """
+    Collects nested timing spans, counters and histograms for a pipeline run
+    and renders them as a JSON report.
+
+    Spans are keyed by their path in the span tree (e.g. "file/parse"), so
+    repeated stages aggregate into a single latency histogram rather than one
+    entry per call.
+    """
+
+    def __init__(self, pipeline: str,
+                 profile_stages: Optional[Iterable[str]] = None,
+                 tracemalloc_stages: Optional[Iterable[str]] = None):
+        self.pipeline = pipeline
+        self.profile_stages = set(profile_stages) if profile_stages is not None else _stages_from_env(PROFILE_ENV)
+        self.tracemalloc_stages = set(tracemalloc_stages) if tracemalloc_stages is not None else _stages_from_env(TRACEMALLOC_ENV)
+        self.started_at = time.time()
+        self._start_counter = time.perf_counter()
+        self._stack: List[str] = []
+        self.spans: Dict[str, Histogram] = {}
+        self.counters: Dict[str, int] = {}
+        self.histograms: Dict[str, Histogram] = {}
+        self.profiles: Dict[str, dict] = {}
+        # One profiler per span path, re-enabled on every call so the report
+        # covers all of them rather than the last
+        self._profilers: Dict[str, cProfile.Profile] = {}
+        self._profiler_active = False
+        # Absolute tracemalloc peak seen so far by each open traced span
+        self._memory_peaks: List[int] = []
+
+    def _wants(self, stages: set, name: str) -> bool:
+        return 'all' in stages or name in stages
+
+    @contextmanager
+    def span(self, name: str, profile: bool = False, trace_memory: bool = False):
+        """
+        Times the enclosed block as a child of the currently open span.
+
+        Args:
+            name: Stage name, joined onto the parent path with "/".
+            profile: Run the block under cProfile. Also enabled via PIPELINE_PROFILE.
+            trace_memory: Record peak allocations with tracemalloc. Also enabled
+                via PIPELINE_TRACEMALLOC.
+        """
+        self._stack.append(name)
+        path = '/'.join(self._stack)
+
+        # cProfile cannot be nested, so only the outermost profiled span wins.
+        profiler = None
+        if (profile or self._wants(self.profile_stages, name)) and not self._profiler_active:
+            profiler = self._profilers.get(path)
+            if profiler is None:
+                profiler = self._profilers[path] = cProfile.Profile()
+            self._profiler_active = True
+
+        tracing = trace_memory or self._wants(self.tracemalloc_stages, name)
+        started_tracing = False
+        if tracing:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                started_tracing = True
+            elif self._memory_peaks:
+                # reset_peak is global, so bank the enclosing span's peak first
+                self._memory_peaks[-1] = max(self._memory_peaks[-1], tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+            memory_before = tracemalloc.get_traced_memory()[0]
+            self._memory_peaks.append(memory_before)
+
+        if profiler is not None:
+            profiler.enable()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            if profiler is not None:
+                profiler.disable()
+                self._profiler_active = False
+            if tracing:
+                current, peak = tracemalloc.get_traced_memory()
+                peak = max(peak, self._memory_peaks.pop())
+                if self._memory_peaks:
+                    self._memory_peaks[-1] = max(self._memory_peaks[-1], peak)
+                entry = self.profiles.setdefault(path, {})
+                entry['memory_peak_bytes'] = max(entry.get('memory_peak_bytes', 0), peak - memory_before)
+                # Summed over calls: what the stage leaves behind across the run
+                entry['memory_retained_bytes'] = entry.get('memory_retained_bytes', 0) + current - memory_before
+                if started_tracing:
+                    tracemalloc.stop()
+            histogram = self.spans.get(path)
+            if histogram is None:
+                histogram = self.spans[path] = Histogram()
+            histogram.record(elapsed)
+            self._stack.pop()
+
+    @staticmethod
+    def _render_profile(profiler: cProfile.Profile, limit: int = 25) -> str:
+        stream = io.StringIO()
+        stats = pstats.Stats(profiler, stream=stream)
+        stats.sort_stats('cumulative').print_stats(limit)
+        return stream.getvalue()
+
+    def count(self, name: str, value: int = 1):
+        """Increments a counter, e.g. files processed or bytes written."""
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name: str, value: float):
+        """Records a value into a named histogram (sizes, scores, ...)."""
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram()
+        histogram.record(value)
+
+    def report(self) -> dict:
+        return {
+            'pipeline': self.pipeline,
+            'started_at': datetime.fromtimestamp(self.started_at).isoformat(timespec='seconds'),
+            'finished_at': datetime.now().isoformat(timespec='seconds'),
+            'wall_time': time.perf_counter() - self._start_counter,
+            'spans': {path: hist.summary() for path, hist in self.spans.items()},
+            'counters': dict(self.counters),
+            'histograms': {name: hist.summary() for name, hist in self.histograms.items()},
+            'profiles': self._profiles_report(),
+        }
+
+    def _profiles_report(self) -> Dict[str, dict]:
+        profiles = {path: dict(entry) for path, entry in self.profiles.items()}
+        for path, profiler in self._profilers.items():
+            profiles.setdefault(path, {})['cprofile'] = self._render_profile(profiler)
+        return profiles
+
+    def write_report(self, report_dir: Optional[str] = None) -> str:
+        """
+        Writes the report as JSON to {report_dir}/{pipeline}-{timestamp}.json.
+        Defaults to PIPELINE_REPORT_DIR, falling back to ./reports.
+        """
+        report_dir = report_dir or os.getenv(REPORT_DIR_ENV, 'reports')
+        os.makedirs(report_dir, exist_ok=True)
+        stamp = datetime.fromtimestamp(self.started_at).strftime('%Y%m%d-%H%M%S')
+        path = os.path.join(report_dir, f"{self.pipeline}-{stamp}.json")
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.report(), f, indent=2)
+        return path
+
+    def print_summary(self):
+        report = self.report()
+        print(f"\n=== {self.pipeline} Summary ===")
+        for name, value in report['counters'].items():
+            print(f"{name}: {value}")
+        for path, stats in report['spans'].items():
+            if stats['count'] == 0:
+                continue
+            print(f"{path}: n={stats['count']} total={stats['total']:.2f}s "
+                  f"p50={stats['p50'] * 1000:.1f}ms p95={stats['p95'] * 1000:.1f}ms "
+                  f"p99={stats['p99'] * 1000:.1f}ms")
+        for name, stats in report['histograms'].items():
+            if stats['count'] == 0:
+                continue
+            print(f"{name}: n={stats['count']} mean={stats['mean']:.4g} "
+                  f"p50={stats['p50']:.4g} p95={stats['p95']:.4g} p99={stats['p99']:.4g}")
+        print(f"Total processing time: {report['wall_time']:.2f}s")
+        print(f"Started at: {report['started_at']}")
+        print(f"Finished at: {report['finished_at']}")
+
+    def finish(self, report_dir: Optional[str] = None) -> str:
+        """Prints the summary and writes the report, returning its path."""
+        self.print_summary()
+        path = self.write_report(report_dir)
+        print(f"Report written to: {path}")
+        return path
@@ -0,0 +1,437 @@
+import json
+import os
+import re
+import sys
+import time
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# BM25 inverted index over news chunks, built next to the embeddings in
+# process_news.py so keyword, ticker and phrase lookups never need the
+# embedding model. On disk an index is a directory of .npy arrays (memory
+# mapped on load) plus meta.json with the vocabulary and chunk ids:
+#   term_ptr / doc_ids / tfs          postings, sorted by doc id per term
+#   pos_ptr / positions               token offsets of each posting, for phrases
+#   term_block_ptr / block_first /    postings cut into BLOCK_SIZE blocks with
+#   block_last / block_max            their doc range and best BM25 score
+#   doc_len / doc_symbol / doc_date   per chunk length and filter columns
+# Queries score whole blocks at a time in order of their score upper bound
+# and stop once no remaining block can beat the current k-th hit. Phrase
+# queries score only the docs holding every phrase word, found from the
+# rarest word's postings, and read offsets for the best of those only.
+
+BLOCK_SIZE = 128
+K1 = 1.2
+B = 0.75
+RRF_K = 60
+
+_TOKEN = re.compile(r"[a-z0-9]+(?:[.'][a-z0-9]+)*")
+_PHRASE = re.compile(r'"([^"]+)"')
+_NO_DATE = -1
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN.findall(text.lower())
+
+
+def _to_days(value) -> int:
+    """Days since epoch for a date, datetime or ISO string; -1 when missing or unparsable."""
+    if value is None or value == '':
+        return _NO_DATE
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value[:10])
+        except ValueError:
+            return _NO_DATE
+    if isinstance(value, datetime):
+        value = value.date()
+    return (value - date(1970, 1, 1)).days
+
+
+def _sorted_unique(values: np.ndarray) -> np.ndarray:
+    # np.unique hashes since numpy 2.3, which is slower than sorting here
+    values = np.sort(values)
+    return values[np.concatenate(([True], values[1:] != values[:-1]))] if len(values) else values
+
+
+@dataclass
+class Hit:
+    chunk_id: str
+    score: float
+
+
+class LexicalIndexBuilder:
+    """Accumulates chunks in memory and writes the on-disk index."""
+
+    def __init__(self):
+        self.chunk_ids: List[str] = []
+        self.symbols: List[Optional[str]] = []
+        self.dates: List[int] = []
+        # term -> doc -> token offsets of the term in that doc
+        self.postings: Dict[str, Dict[int, List[int]]] = {}
+        self.doc_len: List[int] = []
+
+    def add(self, chunk_id: str, text: str, symbol: Optional[str] = None, date=None):
+        doc = len(self.chunk_ids)
+        tokens = tokenize(text)
+        for offset, token in enumerate(tokens):
+            self.postings.setdefault(token, {}).setdefault(doc, []).append(offset)
+        self.chunk_ids.append(chunk_id)
+        self.symbols.append(symbol)
+        self.dates.append(_to_days(date))
+        self.doc_len.append(len(tokens))
+
+    def write(self, index_dir: str):
+        os.makedirs(index_dir, exist_ok=True)
+        n_docs = len(self.chunk_ids)
+        doc_len = np.asarray(self.doc_len, dtype=np.uint32)
+        avgdl = float(doc_len.mean()) if n_docs else 0.0
+        norm = K1 * (1 - B + B * doc_len / max(avgdl, 1e-9))
+
+        terms = sorted(self.postings)
+        term_ptr = [0]
+        term_block_ptr = [0]
+        doc_ids, tfs, positions, block_first, block_last, block_max = [], [], [], [], [], []
+        for term in terms:
+            docs = np.fromiter(sorted(self.postings[term]), dtype=np.uint32)
+            offsets = [self.postings[term][d] for d in docs.tolist()]
+            freqs = np.asarray([len(o) for o in offsets], dtype=np.uint32)
+            positions.append(np.fromiter((p for o in offsets for p in o), dtype=np.uint32, count=int(freqs.sum())))
+            idf = _idf(n_docs, len(docs))
+            scores = idf * freqs * (K1 + 1) / (freqs + norm[docs])
+
+            doc_ids.append(docs)
+            tfs.append(freqs)
+            term_ptr.append(term_ptr[-1] + len(docs))
+            starts = np.arange(0, len(docs), BLOCK_SIZE)
+            block_first.append(docs[starts])
+            block_last.append(docs[np.minimum(starts + BLOCK_SIZE, len(docs)) - 1])
+            block_max.append(np.maximum.reduceat(scores, starts))
+            term_block_ptr.append(term_block_ptr[-1] + len(starts))
+
+        symbols = sorted({s for s in self.symbols if s is not None})
+        symbol_codes = {s: i for i, s in enumerate(symbols)}
+        arrays = {
+            'term_ptr': np.asarray(term_ptr, dtype=np.int64),
+            'doc_ids': np.concatenate(doc_ids) if doc_ids else np.empty(0, dtype=np.uint32),
+            'tfs': np.concatenate(tfs) if tfs else np.empty(0, dtype=np.uint32),
+            'pos_ptr': np.concatenate(([0], np.cumsum(np.concatenate(tfs), dtype=np.int64))) if tfs else np.zeros(1, dtype=np.int64),
+            'positions': np.concatenate(positions) if positions else np.empty(0, dtype=np.uint32),
+            'term_block_ptr': np.asarray(term_block_ptr, dtype=np.int64),
+            'block_first': np.concatenate(block_first) if block_first else np.empty(0, dtype=np.uint32),
+            'block_last': np.concatenate(block_last) if block_last else np.empty(0, dtype=np.uint32),
+            'block_max': np.concatenate(block_max) if block_max else np.empty(0),
+            'doc_len': doc_len,
+            'doc_symbol': np.asarray([symbol_codes.get(s, -1) for s in self.symbols], dtype=np.int32),
+            'doc_date': np.asarray(self.dates, dtype=np.int32),
+        }
+        for name, array in arrays.items():
+            np.save(os.path.join(index_dir, f"{name}.npy"), array)
+
+        meta = {
+            'n_docs': n_docs,
+            'avgdl': avgdl,
+            'k1': K1,
+            'b': B,
+            'block_size': BLOCK_SIZE,
+            'terms': terms,
+            'symbols': symbols,
+            'chunk_ids': self.chunk_ids,
+        }
+        with open(os.path.join(index_dir, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+
+
+def _idf(n_docs: int, doc_freq: int) -> float:
+    return float(np.log(1 + (n_docs - doc_freq + 0.5) / (doc_freq + 0.5)))
+
+
+class LexicalIndex:
+    """Read side of the index written by LexicalIndexBuilder."""
+
+    def __init__(self, index_dir: str):
+        self.index_dir = index_dir
+        with open(os.path.join(index_dir, 'meta.json'), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        self.n_docs = meta['n_docs']
+        self.avgdl = meta['avgdl']
+        self.k1 = meta['k1']
+        self.b = meta['b']
+        self.terms = {term: i for i, term in enumerate(meta['terms'])}
+        self.symbols = {symbol: i for i, symbol in enumerate(meta['symbols'])}
+        self.chunk_ids = meta['chunk_ids']
+
+        for name in ['term_ptr', 'doc_ids', 'tfs', 'pos_ptr', 'positions', 'term_block_ptr', 'block_first',
+                     'block_last', 'block_max', 'doc_len', 'doc_symbol', 'doc_date']:
+            # Plain ndarray views over the memory map; numpy.memmap slicing is much slower
+            setattr(self, name, np.asarray(np.load(os.path.join(index_dir, f"{name}.npy"), mmap_mode='r')))
+        self.norm = self.k1 * (1 - self.b + self.b * np.asarray(self.doc_len) / max(self.avgdl, 1e-9))
+
+    def _postings(self, term: int) -> np.ndarray:
+        return self.doc_ids[int(self.term_ptr[term]):int(self.term_ptr[term + 1])]
+
+    def _phrase_candidates(self, phrases: List[List[int]]) -> np.ndarray:
+        """
+        Sorted docs holding every word of every phrase. Starts from the rarest
+        word's postings and looks the survivors up in the other lists, so the
+        cost follows the rarest word rather than the longest list.
+        """
+        words = sorted({term for phrase in phrases for term in phrase},
+                       key=lambda term: int(self.term_ptr[term + 1] - self.term_ptr[term]))
+        docs = self._postings(words[0]).astype(np.int64)
+        for term in words[1:]:
+            postings = self._postings(term)
+            found = np.minimum(np.searchsorted(postings, docs), len(postings) - 1)
+            docs = docs[postings[found] == docs]
+        return docs
+
+    def _phrase_matches(self, docs: np.ndarray, phrase: List[int]) -> np.ndarray:
+        """
+        Mask of the docs (sorted, each holding every phrase term) where the
+        terms occur at consecutive token offsets. Reads only these docs' positions.
+        """
+        # Key each occurrence by (doc, offset the phrase would start at) and
+        # intersect the keys of successive terms
+        span = int(self.doc_len[docs].max()) + len(phrase)
+        keys = None
+        for offset, term in enumerate(phrase):
+            postings = int(self.term_ptr[term]) + np.searchsorted(self._postings(term), docs)
+            first = self.pos_ptr[postings]
+            counts = self.pos_ptr[postings + 1] - first
+            flat = np.repeat(first - np.cumsum(counts) + counts, counts) + np.arange(int(counts.sum()))
+            term_keys = (np.repeat(np.arange(len(docs)), counts) * span
+                         + self.positions[flat].astype(np.int64) + len(phrase) - offset)
+            if keys is None:
+                keys = term_keys
+            else:
+                # Offsets are stored in order, so both key arrays are already sorted
+                found = np.minimum(np.searchsorted(term_keys, keys), len(term_keys) - 1)
+                keys = keys[term_keys[found] == keys]
+        matched = np.zeros(len(docs), dtype=bool)
+        matched[keys // span] = True
+        return matched
+
+    def _filter(self, docs: np.ndarray, symbol_code: Optional[int], start_days: Optional[int],
+                end_days: Optional[int]) -> np.ndarray:
+        """Keeps the docs matching the symbol and date filters, reading only their columns."""
+        if symbol_code is not None:
+            docs = docs[self.doc_symbol[docs] == symbol_code]
+        if start_days is not None or end_days is not None:
+            doc_date = self.doc_date[docs]
+            keep = doc_date != _NO_DATE
+            if start_days is not None:
+                keep &= doc_date >= start_days
+            if end_days is not None:
+                keep &= doc_date <= end_days
+            docs = docs[keep]
+        return docs
+
+    def _score(self, docs: np.ndarray, postings: List[Tuple[np.ndarray, np.ndarray, float]]) -> np.ndarray:
+        """Exact BM25 for docs (sorted) against every query term."""
+        scores = np.zeros(len(docs))
+        norm = self.norm[docs]
+        for term_docs, term_tfs, idf in postings:
+            positions = np.searchsorted(term_docs, docs)
+            positions[positions == len(term_docs)] = 0
+            found = term_docs[positions] == docs
+            tf = np.where(found, term_tfs[positions], 0).astype(np.float64)
+            scores += idf * tf * (self.k1 + 1) / (tf + norm)
+        return scores
+
+    def search(self, query: str, k: int = 10, symbol: Optional[str] = None,
+               start_date=None, end_date=None) -> List[Hit]:
+        """
+        Top-k BM25 search.
+
+        Args:
+            query: Free text. Quoted parts ("carbon negative by 2030") must also
+                appear as an exact phrase in the chunk.
+            k: Number of hits to return.
+            symbol: Only chunks stored under this ticker.
+            start_date, end_date: Inclusive article date bounds (date or YYYY-MM-DD).
+
+        Returns:
+            Hits ordered by descending score.
+
+        Raises:
+            ValueError: symbol was given but the index was built without symbols,
+                so the filter could never match.
+        """
+        if symbol is not None and not self.symbols:
+            raise ValueError(f"Cannot filter by symbol {symbol}: {self.index_dir} has no chunk symbols")
+        phrases = [tokenize(phrase) for phrase in _PHRASE.findall(query)]
+        phrases = [phrase for phrase in phrases if phrase]
+        term_ids = sorted({self.terms[token] for token in tokenize(query) if token in self.terms})
+        if not term_ids or k <= 0:
+            return []
+        if any(word not in self.terms for phrase in phrases for word in phrase):
+            return []
+        phrases = [[self.terms[word] for word in phrase] for phrase in phrases]
+        symbol_code = None
+        if symbol is not None:
+            if symbol not in self.symbols:
+                return []
+            symbol_code = self.symbols[symbol]
+        start_days = None if start_date is None else _to_days(start_date)
+        end_days = None if end_date is None else _to_days(end_date)
+
+        postings, blocks = [], []
+        for t in term_ids:
+            start, stop = int(self.term_ptr[t]), int(self.term_ptr[t + 1])
+            postings.append((np.asarray(self.doc_ids[start:stop]), np.asarray(self.tfs[start:stop]),
+                             _idf(self.n_docs, stop - start)))
+            blocks.append((int(self.term_block_ptr[t]), int(self.term_block_ptr[t + 1])))
+
+        if phrases:
+            # Every hit holds the phrase words, so score just those docs and
+            # check positions in descending score order until k of them match
+            docs = self._filter(self._phrase_candidates(phrases), symbol_code, start_days, end_days)
+            scores = self._score(docs, postings)
+            matched = []
+            ceiling, batch = np.inf, k
+            while sum(map(len, matched)) < k:
+                # The next best docs, all ties included, without sorting every score
+                floor = -np.partition(-scores, batch - 1)[batch - 1] if batch < len(scores) else -np.inf
+                chosen = np.flatnonzero((scores >= floor) & (scores < ceiling))
+                for phrase in phrases:
+                    if len(chosen) == 0:
+                        break
+                    chosen = chosen[self._phrase_matches(docs[chosen], phrase)]
+                matched.append(chosen)
+                if floor == -np.inf:
+                    break
+                ceiling, batch = floor, batch * 2
+            hits = np.concatenate(matched)
+            best = hits[np.lexsort((docs[hits], -scores[hits]))[:k]]
+            return [Hit(self.chunk_ids[doc], float(score))
+                    for doc, score in zip(docs[best].tolist(), scores[best].tolist())]
+
+        # Upper bound per block: its own best score plus, for every other
+        # term, the best block of that term overlapping the same doc range.
+        owner = np.concatenate([np.full(stop - start, i) for i, (start, stop) in enumerate(blocks)])
+        first = np.concatenate([np.asarray(self.block_first[start:stop]) for start, stop in blocks])
+        last = np.concatenate([np.asarray(self.block_last[start:stop]) for start, stop in blocks])
+        bounds = np.concatenate([np.asarray(self.block_max[start:stop]) for start, stop in blocks])
+        for i, (start, stop) in enumerate(blocks):
+            other_first = np.asarray(self.block_first[start:stop])
+            other_last = np.asarray(self.block_last[start:stop])
+            # Trailing -inf lets reduceat take ranges ending at the last block
+            other_max = np.append(np.asarray(self.block_max[start:stop]), -np.inf)
+            lo = np.searchsorted(other_last, first)
+            hi = np.searchsorted(other_first, last, side='right')
+            overlap = (owner != i) & (lo < hi)
+            if overlap.any():
+                ranges = np.column_stack([lo[overlap], hi[overlap]]).ravel()
+                bounds[overlap] += np.maximum.reduceat(other_max, ranges)[::2]
+        # Best score each term can add to any doc, lowest first
+        term_max = np.asarray([float(np.max(self.block_max[start:stop])) for start, stop in blocks])
+        by_max = np.argsort(term_max, kind='stable')
+
+        offsets = np.cumsum([0] + [stop - start for start, stop in blocks])
+        order = np.argsort(-bounds, kind='stable')
+        # Sorted docs already scored; stays small because scoring stops early
+        scored = np.empty(0, dtype=np.int64)
+        top_docs = np.empty(0, dtype=np.int64)
+        top_scores = np.empty(0)
+        threshold = -np.inf
+
+        # Blocks go in descending bound order, in batches that double in size:
+        # the first few blocks set a threshold quickly, later batches amortise
+        # the per-call numpy overhead over more postings.
+        position, batch = 0, 1
+        while position < len(order):
+            chosen = order[position:position + batch]
+            position += batch
+            batch *= 2
+            if len(top_docs) == k:
+                # Ties go to the lower doc id, so a bound equal to the k-th
+                # score still has to be read
+                chosen = chosen[bounds[chosen] >= threshold]
+                if len(chosen) == 0:
+                    break
+
+            pieces = []
+            for index in chosen.tolist():
+                term = int(owner[index])
+                block = index - int(offsets[term])
+                pieces.append(postings[term][0][block * BLOCK_SIZE:(block + 1) * BLOCK_SIZE])
+            docs = _sorted_unique(np.concatenate(pieces).astype(np.int64))
+            if len(scored):
+                docs = docs[~np.isin(docs, scored, assume_unique=True)]
+            if len(docs) == 0:
+                continue
+            scored = np.sort(np.concatenate([scored, docs]), kind='stable')
+            docs = self._filter(docs, symbol_code, start_days, end_days)
+            if len(docs) == 0:
+                continue
+
+            scores = self._score(docs, postings)
+            if len(top_docs) == k:
+                keep = scores >= threshold
+                docs, scores = docs[keep], scores[keep]
+            top_docs = np.concatenate([top_docs, docs])
+            top_scores = np.concatenate([top_scores, scores])
+            if len(top_docs) > k:
+                best = np.lexsort((top_docs, -top_scores))[:k]
+                top_docs, top_scores = top_docs[best], top_scores[best]
+            if len(top_docs) == k and top_scores.min() > threshold:
+                threshold = top_scores.min()
+                # A doc holding only terms whose best scores sum to less than
+                # the threshold cannot get in, so blocks of those terms need not be
+                # read: any doc that can get in is reached through another term
+                skipped = by_max[np.cumsum(term_max[by_max]) < threshold]
+                if len(skipped):
+                    remaining = order[position:]
+                    order, position = remaining[~np.isin(owner[remaining], skipped)], 0
+
+        ranked = np.lexsort((top_docs, -top_scores))
+        return [Hit(self.chunk_ids[doc], float(score))
+                for doc, score in zip(top_docs[ranked].tolist(), top_scores[ranked].tolist())]
+
+
+def reciprocal_rank_fusion(rankings: Iterable[Sequence[str]], k: int = RRF_K,
+                           limit: Optional[int] = None) -> List[Tuple[str, float]]:
+    """
+    Fuses ranked lists of chunk ids (best first) by summing 1 / (k + rank).
+    Scores from different retrievers are never compared directly, so BM25
+    and cosine similarity can be mixed without calibration.
+    """
+    fused: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking, start=1):
+            fused[chunk_id] = fused.get(chunk_id, 0.0) + 1 / (k + rank)
+    ordered = sorted(fused.items(), key=lambda item: item[1], reverse=True)
+    return ordered[:limit] if limit is not None else ordered
+
+
+def hybrid_search(index: LexicalIndex, query: str, vector_results: Sequence[str], k: int = 10,
+                  symbol: Optional[str] = None, start_date=None, end_date=None) -> List[Tuple[str, float]]:
+    """
+    RRF of lexical hits with dense results (chunk ids from the pgvector query,
+    best first, already filtered the same way).
+    """
+    lexical = [hit.chunk_id for hit in index.search(query, k, symbol, start_date, end_date)]
+    return reciprocal_rank_fusion([lexical, vector_results], limit=k)
+
+
+if __name__ == "__main__":
+    index_dir = 'test_data/news_index'
+    if not os.path.exists(os.path.join(index_dir, 'meta.json')):
+        print(f"No index at {index_dir}, run process_news.py first")
+        sys.exit(0)
+
+    query = ' '.join(sys.argv[1:]) or '"carbon negative by 2030"'
+    index = LexicalIndex(index_dir)
+    hits = index.search(query)  # warms the memory maps
+    latencies = []
+    for _ in range(100):
+        start_time = time.perf_counter()
+        index.search(query)
+        latencies.append(time.perf_counter() - start_time)
+    for hit in hits:
+        print(f"{hit.score:8.3f}  {hit.chunk_id}")
+    print(f"{len(hits)} hits over {index.n_docs} chunks, "
+          f"p50 {np.percentile(latencies, 50) * 1000:.3f}ms p99 {np.percentile(latencies, 99) * 1000:.3f}ms")
@@ -1,4 +1,6 @@
 import os
+import re
+import sys
 import trafilatura
 from mteb import MTEB
 from sentence_transformers import SentenceTransformer
@@ -8,6 +10,20 @@ import numpy as np
 from datetime import datetime
 import json
 from langchain.text_splitter import RecursiveCharacterTextSplitter
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from instrumentation import Instrumentation
+from lexical_index import LexicalIndexBuilder
+
+metrics = Instrumentation('process_news')
+
+# BM25 index written next to the chunks for keyword / phrase lookups
+INDEX_DIR = 'test_data/news_index'
+
+# Exchange tags like "(NYSE:V)" or "(NASDAQ: MSFT)", the only ticker the
+# articles themselves carry. Untagged articles are indexed without a symbol.
+TICKER_TAG = re.compile(r'\((?:NYSE|NASDAQ|Nasdaq|AMEX|NYSEARCA|OTC)\s*:\s*([A-Z][A-Z.]{0,5})\)')
 
 # PostgreSQL configuration
 DB_CONFIG = {
@@ -31,14 +47,17 @@ def extract_content(html_file):
     
     # Extract metadata
     metadata = trafilatura.extract_metadata(html_content)
+    title = metadata.title if metadata else None
+    ticker = TICKER_TAG.search(f"{title or ''}\n{content}")
     
     return {
         'content': content,
-        'title': metadata.title if metadata else None,
+        'title': title,
         'author': metadata.author if metadata else None,
         'date': metadata.date if metadata else None,
         'url': metadata.url if metadata else None,
-        'source': os.path.basename(html_file)
+        'source': os.path.basename(html_file),
+        'symbol': ticker.group(1) if ticker else None
     }
 
 def chunk_text(text):
@@ -110,7 +129,10 @@ def process_news_files():
     print("Loading MTEB model...")
 
     # It is receommended for the laptop to have a 16GB ram for this model GG
-    model = SentenceTransformer("Linq-AI-Research/Linq-Embed-Mistral")
+    with metrics.span('load_model'):
+        model = SentenceTransformer("Linq-AI-Research/Linq-Embed-Mistral")
+
+    lexical_index = LexicalIndexBuilder()
     
     # Ensure the articles table exists with pgvector extension
     # conn = psycopg2.connect(**DB_CONFIG)
@@ -123,37 +145,59 @@ def process_news_files():
     #     conn.close()
     
     # Process each HTML file
-    for filename in os.listdir(news_dir):
-        # if filename.endswith('.html'):
+    try:
+        for filename in os.listdir(news_dir):
+            # if filename.endswith('.html'):
 
-        file_path = os.path.join(news_dir, filename)
-        print(f"Processing {filename}...")
-        
-        # Extract content
-        article_data = extract_content(file_path)
-        if not article_data:
-            continue
+            file_path = os.path.join(news_dir, filename)
+            print(f"Processing {filename}...")
         
-        # Split content into chunks
-        chunks = chunk_text(article_data['content'])
-        print(f"Split article into {len(chunks)} chunks")
-        
-        # Create embeddings for each chunk
-        embeddings = []
-        for chunk in chunks:
-            embedding = create_embedding(chunk, model)
-            if embedding:
-                embeddings.append(embedding)
-        
-        if not embeddings:
-            print("Failed to create embeddings for any chunks")
-            continue
-        
-        # print("embeddings: ", embeddings)
-        print("chunks: ", chunks)
-        print("\n\n\n")
-        # Store in database
-        # store_in_postgres(article_data, chunks, embeddings)
+            with metrics.span('file'):
+                # Extract content
+                with metrics.span('extract'):
+                    article_data = extract_content(file_path)
+                if not article_data:
+                    metrics.count('files_failed')
+                    continue
+            
+                # Split content into chunks
+                with metrics.span('chunk'):
+                    chunks = chunk_text(article_data['content'])
+                metrics.count('chunks', len(chunks))
+                metrics.observe('chunks_per_article', len(chunks))
+                print(f"Split article into {len(chunks)} chunks")
+
+                with metrics.span('index'):
+                    for i, chunk in enumerate(chunks):
+                        lexical_index.add(f"{article_data['source']}#{i}", chunk,
+                                          symbol=article_data['symbol'], date=article_data['date'])
+            
+                # Create embeddings for each chunk
+                embeddings = []
+                for chunk in chunks:
+                    with metrics.span('embed'):
+                        embedding = create_embedding(chunk, model)
+                    if embedding:
+                        embeddings.append(embedding)
+            
+                if not embeddings:
+                    print("Failed to create embeddings for any chunks")
+                    metrics.count('files_failed')
+                    continue
+            
+                # print("embeddings: ", embeddings)
+                print("chunks: ", chunks)
+                print("\n\n\n")
+                # Store in database
+                # with metrics.span('store'):
+                #     store_in_postgres(article_data, chunks, embeddings)
+                metrics.count('files_processed')
+
+        with metrics.span('write_index'):
+            lexical_index.write(INDEX_DIR)
+        print(f"Lexical index written to {INDEX_DIR}")
+    finally:
+        metrics.finish()
 
 if __name__ == "__main__":
     print("Starting script...")
@@ -0,0 +1,110 @@
+from datetime import date, timedelta
+from typing import List, Optional, Tuple
+
+import numpy as np
+import pytest
+
+from lexical_index import B, K1, LexicalIndex, LexicalIndexBuilder, _NO_DATE, _PHRASE, _idf, _to_days, tokenize
+
+SYMBOLS = ['AAPL', 'MSFT', 'V', None]
+
+
+def _brute_force(docs: List[List[str]], symbols: List[Optional[str]], dates: List[int], query: str, k: int,
+                 symbol: Optional[str], start_date, end_date) -> List[Tuple[int, float]]:
+    """Scores every doc without the index."""
+    n_docs = len(docs)
+    doc_len = np.asarray([len(doc) for doc in docs], dtype=np.uint32)
+    norm = K1 * (1 - B + B * doc_len / max(float(doc_len.mean()), 1e-9))
+    terms = sorted(set(tokenize(query)))
+    doc_freq = {term: sum(term in doc for doc in docs) for term in terms}
+    phrases = [' '.join(tokenize(phrase)) for phrase in _PHRASE.findall(query)]
+    results = []
+    for i, doc in enumerate(docs):
+        if symbol is not None and symbols[i] != symbol:
+            continue
+        if start_date is not None and (dates[i] == _NO_DATE or dates[i] < _to_days(start_date)):
+            continue
+        if end_date is not None and (dates[i] == _NO_DATE or dates[i] > _to_days(end_date)):
+            continue
+        padded = f" {' '.join(doc)} "
+        if any(f" {phrase} " not in padded for phrase in phrases if phrase):
+            continue
+        score, matched = 0.0, False
+        for term in terms:
+            if not doc_freq[term]:
+                continue
+            tf = doc.count(term)
+            matched = matched or tf > 0
+            score += _idf(n_docs, doc_freq[term]) * tf * (K1 + 1) / (tf + norm[i])
+        if matched:
+            results.append((i, score))
+    results.sort(key=lambda item: (-item[1], item[0]))
+    return results[:k]
+
+
+def _corpus(n_docs: int, seed: int):
+    rng = np.random.default_rng(seed)
+    vocab = [f"w{i}" for i in range(2000)]
+    # Zipf-like term frequencies so postings span several blocks
+    weights = 1 / np.arange(1, len(vocab) + 1)
+    weights /= weights.sum()
+    docs, symbols, dates = [], [], []
+    for _ in range(n_docs):
+        docs.append([vocab[t] for t in rng.choice(len(vocab), int(rng.integers(5, 120)), p=weights)])
+        symbols.append(SYMBOLS[int(rng.integers(len(SYMBOLS)))])
+        day = None if rng.random() < 0.05 else date(2020, 1, 1) + timedelta(days=int(rng.integers(366)))
+        dates.append(day)
+    return rng, vocab, weights, docs, symbols, dates
+
+
+def _queries(rng, vocab, weights, docs, n_queries: int):
+    queries = []
+    for _ in range(n_queries):
+        words = [vocab[t] for t in rng.choice(len(vocab), int(rng.integers(1, 4)), p=weights)]
+        source = docs[int(rng.integers(len(docs)))]
+        start = int(rng.integers(max(1, len(source) - 2)))
+        kind = rng.integers(4)
+        if kind == 0:
+            query = ' '.join(words)
+        elif kind == 1:
+            # Phrase taken from a doc, so at least one hit exists
+            query = f'"{" ".join(source[start:start + 2])}" {words[0]}'
+        elif kind == 2:
+            # Same words reversed, mostly without an exact match
+            query = f'"{" ".join(reversed(source[start:start + 2]))}"'
+        else:
+            query = f'"{" ".join(source[start:start + 3])}"'
+        symbol = SYMBOLS[int(rng.integers(len(SYMBOLS)))] if rng.random() < 0.5 else None
+        start_date, end_date = (None, None) if rng.random() < 0.5 else ('2020-03-01', '2020-09-30')
+        queries.append((query, int(rng.integers(1, 20)), symbol, start_date, end_date))
+    # Fixed cases: unknown ticker, unknown phrase word, open-ended date range
+    queries += [('w1 w2', 10, 'TSLA', None, None), ('"w1 nosuchword"', 10, None, None, None),
+                ('w3', 10, None, '2020-06-01', None), ('w3', 10, None, None, '2020-06-01')]
+    return queries
+
+
+def test_search_matches_brute_force(tmp_path):
+    rng, vocab, weights, docs, symbols, dates = _corpus(3000, seed=0)
+    builder = LexicalIndexBuilder()
+    for i, doc in enumerate(docs):
+        builder.add(f"doc{i}", ' '.join(doc), symbol=symbols[i], date=dates[i])
+    builder.write(str(tmp_path))
+    index = LexicalIndex(str(tmp_path))
+    days = [_to_days(day) for day in dates]
+
+    for query, k, symbol, start_date, end_date in _queries(rng, vocab, weights, docs, 200):
+        hits = index.search(query, k, symbol, start_date, end_date)
+        expected = _brute_force(docs, symbols, days, query, k, symbol, start_date, end_date)
+        got = [(int(hit.chunk_id[3:]), hit.score) for hit in hits]
+        context = f"search({query!r}, k={k}, symbol={symbol}, {start_date}..{end_date})"
+        assert [doc for doc, _ in got] == [doc for doc, _ in expected], context
+        assert np.allclose([score for _, score in got], [score for _, score in expected]), context
+
+
+def test_symbol_filter_without_symbols_raises(tmp_path):
+    builder = LexicalIndexBuilder()
+    builder.add('doc0', 'no symbols here')
+    builder.write(str(tmp_path))
+
+    with pytest.raises(ValueError):
+        LexicalIndex(str(tmp_path)).search('symbols', symbol='AAPL')
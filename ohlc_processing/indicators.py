@@ -0,0 +1,482 @@
+import sys
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from instrumentation import Instrumentation
+
+metrics = Instrumentation('indicators')
+
+# Indicators over OHLC bars in two modes:
+#   batch      - vectorized over whole bar arrays, shape (T,) or (symbols, T)
+#                with time on the last axis.
+#   streaming  - one object per indicator holding state for every symbol, so
+#                a single update() call advances thousands of symbols by one
+#                bar in O(1) each. Windowed stats keep a ring buffer per
+#                symbol plus running sums; the sums are re-summed from the
+#                ring every time it wraps so float drift stays bounded.
+# Both modes agree to within float rounding and use NaN until a window fills.
+# Prices stay in whatever units they arrive in (preprocess_ohlc scales by 100).
+# Cumulative VWAP restarts every session, i.e. every trading day in exchange
+# time; extended hours run past midnight UTC, so UTC days would split them.
+SESSION_TZ = 'America/New_York'
+
+
+# ---------------------------------------------------------------------------
+# Batch mode
+# ---------------------------------------------------------------------------
+
+def _shift(values: np.ndarray, periods: int = 1) -> np.ndarray:
+    shifted = np.full_like(values, np.nan, dtype=np.float64)
+    shifted[..., periods:] = values[..., :-periods]
+    return shifted
+
+
+def _rolling_sum(values: np.ndarray, window: int) -> np.ndarray:
+    """Sum over the trailing window along the last axis, NaN until it is full."""
+    totals = np.cumsum(values, axis=-1, dtype=np.float64)
+    result = np.full_like(totals, np.nan)
+    if values.shape[-1] < window:
+        return result
+    result[..., window - 1] = totals[..., window - 1]
+    result[..., window:] = totals[..., window:] - totals[..., :-window]
+    return result
+
+
+def _session_cumsum(values: np.ndarray, session_start: Optional[np.ndarray]) -> np.ndarray:
+    """Cumulative sum along the last axis that restarts wherever session_start is True."""
+    totals = np.cumsum(values, axis=-1)
+    if session_start is None:
+        return totals
+    positions = np.where(session_start, np.arange(values.shape[-1]), 0)
+    latest = np.maximum.accumulate(positions, axis=-1)
+    return totals - np.take_along_axis(totals - values, latest, axis=-1)
+
+
+def trading_days(timestamp: np.ndarray) -> np.ndarray:
+    """
+    Trading day (datetime64[D] in SESSION_TZ) of each bar. timestamp holds
+    datetimes (naive means UTC) or int epoch seconds.
+    """
+    timestamp = np.asarray(timestamp)
+    if np.issubdtype(timestamp.dtype, np.number):
+        index = pd.to_datetime(timestamp, unit='s')
+    else:
+        index = pd.DatetimeIndex(timestamp)
+    if index.tz is None:
+        index = index.tz_localize('UTC')
+    return index.tz_convert(SESSION_TZ).tz_localize(None).to_numpy().astype('datetime64[D]')
+
+
+def session_starts(timestamp: np.ndarray) -> np.ndarray:
+    """Marks the first bar of each trading day in SESSION_TZ; timestamp is ascending."""
+    days = trading_days(timestamp)
+    starts = np.ones(len(days), dtype=bool)
+    starts[1:] = days[1:] != days[:-1]
+    return starts
+
+
+def simple_returns(close: np.ndarray) -> np.ndarray:
+    close = np.asarray(close, dtype=np.float64)
+    return close / _shift(close) - 1
+
+
+def log_returns(close: np.ndarray) -> np.ndarray:
+    close = np.asarray(close, dtype=np.float64)
+    return np.log(close / _shift(close))
+
+
+def sma(close: np.ndarray, window: int) -> np.ndarray:
+    return _rolling_sum(np.asarray(close, dtype=np.float64), window) / window
+
+
+def ema(close: np.ndarray, span: int) -> np.ndarray:
+    """Exponential moving average seeded with the first close (pandas adjust=False)."""
+    close = np.asarray(close, dtype=np.float64)
+    frame = pd.DataFrame(np.atleast_2d(close).T)
+    result = frame.ewm(span=span, adjust=False).mean().to_numpy().T
+    return result.reshape(close.shape)
+
+
+def rolling_volatility(close: np.ndarray, window: int) -> np.ndarray:
+    """Sample standard deviation of the last `window` log returns."""
+    returns = log_returns(close)
+    # The first return is undefined; treat it as 0 so cumsums stay finite and
+    # mask the affected window afterwards.
+    filled = np.nan_to_num(returns)
+    total = _rolling_sum(filled, window)
+    total_sq = _rolling_sum(filled * filled, window)
+    variance = (total_sq - total * total / window) / (window - 1)
+    result = np.sqrt(np.maximum(variance, 0))
+    result[..., :window] = np.nan
+    return result
+
+
+def vwap(high: np.ndarray, low: np.ndarray, close: np.ndarray, volume: np.ndarray,
+         window: Optional[int] = None, session_start: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Volume weighted average of the typical price (high + low + close) / 3,
+    cumulative or over a trailing window.
+
+    Args:
+        window: Trailing window in bars; None for the cumulative VWAP.
+        session_start: Boolean mask, same shape as close, of bars where the
+            cumulative VWAP restarts (see session_starts). None accumulates
+            from the first bar. Ignored for windowed VWAP.
+    """
+    typical = (np.asarray(high, dtype=np.float64) + low + close) / 3
+    volume = np.asarray(volume, dtype=np.float64)
+    if window is None:
+        price_volume = _session_cumsum(typical * volume, session_start)
+        total_volume = _session_cumsum(volume, session_start)
+    else:
+        price_volume = _rolling_sum(typical * volume, window)
+        total_volume = _rolling_sum(volume, window)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return price_volume / total_volume
+
+
+def compute_indicators(df: pd.DataFrame, window: int = 20, span: int = 20) -> pd.DataFrame:
+    """
+    Adds batch indicator columns to a frame of bars, computed per symbol when
+    a symbol column is present. Rows must be in ascending time per symbol.
+    The cumulative vwap restarts at each session (see session_starts).
+
+    Symbols with the same number of bars are stacked into one (symbols, bars)
+    array, so a universe of equal-length histories is a single call per
+    indicator rather than a Python loop over symbols.
+    """
+    df = df.copy()
+    codes = (df.groupby('symbol', sort=False, observed=True).ngroup().to_numpy()
+             if 'symbol' in df else np.zeros(len(df), dtype=np.int64))
+    columns = ['return', 'log_return', 'sma', 'ema', 'volatility', 'vwap', 'rolling_vwap']
+    results = {col: np.full(len(df), np.nan) for col in columns}
+    if len(df) == 0:
+        for col in columns:
+            df[col] = results[col]
+        return df
+
+    # Rows of each symbol, contiguous and in time order
+    order = np.argsort(codes, kind='stable')
+    sizes = np.bincount(codes)
+    group_starts = np.cumsum(sizes) - sizes
+
+    # Trading days are converted once for the whole column; a session starts
+    # where the day changes within a symbol, or at the symbol's first bar.
+    days = trading_days(df['timestamp'].to_numpy())[order]
+    session_start = np.ones(len(df), dtype=bool)
+    session_start[1:] = days[1:] != days[:-1]
+    session_start[group_starts] = True
+
+    high, low, close, volume = (df[col].to_numpy(dtype=np.float64)[order] for col in ['high', 'low', 'close', 'volume'])
+    for length in np.unique(sizes):
+        with metrics.span('batch'):
+            starts = group_starts[sizes == length]
+            rows = starts[:, None] + np.arange(length)
+            h, l, c, v, sessions = high[rows], low[rows], close[rows], volume[rows], session_start[rows]
+            stacked = {
+                'return': simple_returns(c),
+                'log_return': log_returns(c),
+                'sma': sma(c, window),
+                'ema': ema(c, span),
+                'volatility': rolling_volatility(c, window),
+                'vwap': vwap(h, l, c, v, session_start=sessions),
+                'rolling_vwap': vwap(h, l, c, v, window),
+            }
+            for col, values in stacked.items():
+                results[col][order[rows]] = values
+
+    for col in columns:
+        df[col] = results[col]
+    return df
+
+
+# ---------------------------------------------------------------------------
+# Streaming mode
+# ---------------------------------------------------------------------------
+
+class StreamingIndicator(ABC):
+    """
+    Base class for per-symbol streaming state.
+
+    update() takes a batch of bars for distinct symbol ids (integer indices
+    into 0..n_symbols-1) and returns the indicator value for each of them.
+    """
+
+    def __init__(self, n_symbols: int):
+        self.n_symbols = n_symbols
+        self.count = np.zeros(n_symbols, dtype=np.int64)
+
+    @abstractmethod
+    def update(self, ids: np.ndarray, high: np.ndarray, low: np.ndarray,
+               close: np.ndarray, volume: np.ndarray) -> np.ndarray:
+        ...
+
+
+class RollingWindow:
+    """Ring buffer of the last `window` values per symbol with running sums."""
+
+    def __init__(self, n_symbols: int, window: int, squares: bool = False):
+        self.window = window
+        self.ring = np.zeros((n_symbols, window))
+        self.head = np.zeros(n_symbols, dtype=np.int64)
+        self.total = np.zeros(n_symbols)
+        self.total_sq = np.zeros(n_symbols) if squares else None
+
+    def push(self, ids: np.ndarray, values: np.ndarray):
+        slot = self.head[ids]
+        evicted = self.ring[ids, slot]
+        self.ring[ids, slot] = values
+        self.total[ids] += values - evicted
+        if self.total_sq is not None:
+            self.total_sq[ids] += values * values - evicted * evicted
+
+        slot += 1
+        wrapped = slot == self.window
+        slot[wrapped] = 0
+        self.head[ids] = slot
+        if wrapped.any():
+            # Amortised O(1): one O(window) re-sum every `window` pushes
+            resync = ids[wrapped]
+            self.total[resync] = self.ring[resync].sum(axis=1)
+            if self.total_sq is not None:
+                self.total_sq[resync] = np.square(self.ring[resync]).sum(axis=1)
+
+
+class StreamingReturns(StreamingIndicator):
+    """Simple return against the previous close."""
+
+    def __init__(self, n_symbols: int, log: bool = False):
+        super().__init__(n_symbols)
+        self.log = log
+        self.last_close = np.full(n_symbols, np.nan)
+
+    def update(self, ids, high, low, close, volume):
+        previous = self.last_close[ids]
+        self.last_close[ids] = close
+        self.count[ids] += 1
+        return np.log(close / previous) if self.log else close / previous - 1
+
+
+class StreamingSMA(StreamingIndicator):
+
+    def __init__(self, n_symbols: int, window: int):
+        super().__init__(n_symbols)
+        self.buffer = RollingWindow(n_symbols, window)
+
+    def update(self, ids, high, low, close, volume):
+        self.buffer.push(ids, close)
+        self.count[ids] += 1
+        result = self.buffer.total[ids] / self.buffer.window
+        result[self.count[ids] < self.buffer.window] = np.nan
+        return result
+
+
+class StreamingEMA(StreamingIndicator):
+
+    def __init__(self, n_symbols: int, span: int):
+        super().__init__(n_symbols)
+        self.alpha = 2 / (span + 1)
+        self.value = np.full(n_symbols, np.nan)
+
+    def update(self, ids, high, low, close, volume):
+        previous = self.value[ids]
+        result = np.where(self.count[ids] == 0, close, previous + self.alpha * (close - previous))
+        self.value[ids] = result
+        self.count[ids] += 1
+        return result
+
+
+class StreamingVolatility(StreamingIndicator):
+    """Sample standard deviation of the last `window` log returns."""
+
+    def __init__(self, n_symbols: int, window: int):
+        super().__init__(n_symbols)
+        self.returns = StreamingReturns(n_symbols, log=True)
+        self.buffer = RollingWindow(n_symbols, window, squares=True)
+
+    def update(self, ids, high, low, close, volume):
+        returns = np.nan_to_num(self.returns.update(ids, high, low, close, volume))
+        self.buffer.push(ids, returns)
+        self.count[ids] += 1
+
+        window = self.buffer.window
+        total = self.buffer.total[ids]
+        variance = (self.buffer.total_sq[ids] - total * total / window) / (window - 1)
+        result = np.sqrt(np.maximum(variance, 0))
+        result[self.count[ids] <= window] = np.nan
+        return result
+
+
+class StreamingVWAP(StreamingIndicator):
+    """Typical price VWAP, cumulative since construction/reset or over a trailing window."""
+
+    def __init__(self, n_symbols: int, window: Optional[int] = None):
+        super().__init__(n_symbols)
+        self.window = window
+        if window is None:
+            self.price_volume = np.zeros(n_symbols)
+            self.total_volume = np.zeros(n_symbols)
+        else:
+            self.price_volume = RollingWindow(n_symbols, window)
+            self.total_volume = RollingWindow(n_symbols, window)
+
+    def reset(self, ids: np.ndarray):
+        """Restarts the VWAP, e.g. at the start of a session."""
+        if self.window is None:
+            self.price_volume[ids] = 0
+            self.total_volume[ids] = 0
+        else:
+            for buffer in (self.price_volume, self.total_volume):
+                buffer.ring[ids] = 0
+                buffer.total[ids] = 0
+                buffer.head[ids] = 0
+        self.count[ids] = 0
+
+    def update(self, ids, high, low, close, volume):
+        typical_volume = (high + low + close) / 3 * volume
+        self.count[ids] += 1
+        with np.errstate(invalid='ignore', divide='ignore'):
+            if self.window is None:
+                self.price_volume[ids] += typical_volume
+                self.total_volume[ids] += volume
+                return self.price_volume[ids] / self.total_volume[ids]
+
+            self.price_volume.push(ids, typical_volume)
+            self.total_volume.push(ids, volume)
+            result = self.price_volume.total[ids] / self.total_volume.total[ids]
+        result[self.count[ids] < self.window] = np.nan
+        return result
+
+
+class StreamingIndicators:
+    """The same indicators as compute_indicators, maintained bar by bar for many symbols."""
+
+    def __init__(self, n_symbols: int, window: int = 20, span: int = 20):
+        self.indicators: Dict[str, StreamingIndicator] = {
+            'return': StreamingReturns(n_symbols),
+            'log_return': StreamingReturns(n_symbols, log=True),
+            'sma': StreamingSMA(n_symbols, window),
+            'ema': StreamingEMA(n_symbols, span),
+            'volatility': StreamingVolatility(n_symbols, window),
+            'vwap': StreamingVWAP(n_symbols),
+            'rolling_vwap': StreamingVWAP(n_symbols, window),
+        }
+
+    def reset(self, ids: np.ndarray):
+        """Starts a new session for ids: restarts the cumulative vwap, as session_starts does in batch."""
+        self.indicators['vwap'].reset(np.asarray(ids, dtype=np.int64))
+
+    def update(self, ids: np.ndarray, high: np.ndarray, low: np.ndarray,
+               close: np.ndarray, volume: np.ndarray) -> Dict[str, np.ndarray]:
+        """
+        Advances each symbol in ids by one bar. ids must not repeat within a
+        call; feed a symbol's second bar in the next call.
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        high, low, close, volume = (np.asarray(x, dtype=np.float64) for x in (high, low, close, volume))
+        return {name: indicator.update(ids, high, low, close, volume)
+                for name, indicator in self.indicators.items()}
+
+
+# ---------------------------------------------------------------------------
+# Benchmark
+# ---------------------------------------------------------------------------
+
+def _synthetic_bars(n_symbols: int, n_bars: int, seed: int = 0):
+    """Random-walk bars in scaled-integer price units, shape (n_symbols, n_bars)."""
+    rng = np.random.default_rng(seed)
+    close = 10000 * np.exp(np.cumsum(rng.normal(0, 1e-3, (n_symbols, n_bars)), axis=1))
+    high = close * (1 + np.abs(rng.normal(0, 5e-4, close.shape)))
+    low = close * (1 - np.abs(rng.normal(0, 5e-4, close.shape)))
+    volume = rng.integers(100, 50000, close.shape).astype(np.float64)
+    return np.floor(high), np.floor(low), np.floor(close), volume
+
+
+def benchmark(n_symbols: int = 2000, n_bars: int = 500, window: int = 20, span: int = 20,
+              session_bars: int = 200) -> Dict[str, dict]:
+    """
+    Reports bars/sec per indicator for both modes over n_symbols synthetic
+    symbols, plus compute_indicators on the same bars as a frame, and checks
+    all three agree. A new session starts every session_bars bars so the
+    cumulative VWAP reset is covered too.
+    """
+    high, low, close, volume = _synthetic_bars(n_symbols, n_bars)
+    total_bars = n_symbols * n_bars
+    session_start = np.zeros((n_symbols, n_bars), dtype=bool)
+    session_start[:, ::session_bars] = True
+
+    batch_functions = {
+        'return': lambda: simple_returns(close),
+        'log_return': lambda: log_returns(close),
+        'sma': lambda: sma(close, window),
+        'ema': lambda: ema(close, span),
+        'volatility': lambda: rolling_volatility(close, window),
+        'vwap': lambda: vwap(high, low, close, volume, session_start=session_start),
+        'rolling_vwap': lambda: vwap(high, low, close, volume, window),
+    }
+    batch_results = {}
+    batch_rates = {}
+    for name, compute in batch_functions.items():
+        with metrics.span(f"batch/{name}"):
+            start = time.perf_counter()
+            batch_results[name] = compute()
+            batch_rates[name] = total_bars / (time.perf_counter() - start)
+
+    # Every symbol receives its t-th bar in the same update call
+    engine = StreamingIndicators(n_symbols, window, span)
+    ids = np.arange(n_symbols)
+    elapsed = dict.fromkeys(engine.indicators, 0.0)
+    streamed = {name: np.empty((n_symbols, n_bars)) for name in engine.indicators}
+    for t in range(n_bars):
+        if t % session_bars == 0:
+            engine.reset(ids)
+        bar = (high[:, t], low[:, t], close[:, t], volume[:, t])
+        for name, indicator in engine.indicators.items():
+            start = time.perf_counter()
+            streamed[name][:, t] = indicator.update(ids, *bar)
+            elapsed[name] += time.perf_counter() - start
+    streaming_rates = {name: total_bars / seconds for name, seconds in elapsed.items()}
+
+    for name in engine.indicators:
+        if not np.allclose(batch_results[name], streamed[name], rtol=1e-7, atol=1e-9, equal_nan=True):
+            raise ValueError(f"Batch and streaming {name} disagree")
+
+    # The same bars as a long frame, one trading day per session_bars minutes
+    # from 09:30 New York time, interleaved by time like a market-wide feed
+    bar = np.arange(n_bars)
+    minutes = (bar // session_bars) * 1440 + 14 * 60 + 30 + bar % session_bars
+    frame = pd.DataFrame({
+        'symbol': np.tile(np.arange(n_symbols), n_bars),
+        'timestamp': np.repeat(pd.Timestamp('2024-01-02').value // 10**9 + minutes * 60, n_symbols),
+        'high': high.T.ravel(), 'low': low.T.ravel(), 'close': close.T.ravel(), 'volume': volume.T.ravel(),
+    })
+    with metrics.span('frame'):
+        start = time.perf_counter()
+        computed = compute_indicators(frame, window, span)
+        frame_rate = total_bars / (time.perf_counter() - start)
+    for name in engine.indicators:
+        if not np.allclose(computed[name].to_numpy().reshape(n_bars, n_symbols).T, batch_results[name],
+                           rtol=1e-7, atol=1e-9, equal_nan=True):
+            raise ValueError(f"compute_indicators and batch {name} disagree")
+
+    print(f"\n{n_symbols} symbols x {n_bars} bars, window={window}, span={span}")
+    print(f"{'indicator':<14}{'batch bars/s':>16}{'streaming bars/s':>20}")
+    for name in engine.indicators:
+        print(f"{name:<14}{batch_rates[name]:>16,.0f}{streaming_rates[name]:>20,.0f}")
+        metrics.observe(f"batch_bars_per_sec/{name}", batch_rates[name])
+        metrics.observe(f"streaming_bars_per_sec/{name}", streaming_rates[name])
+    print(f"compute_indicators, all of the above from one frame: {frame_rate:,.0f} bars/s")
+    metrics.observe('frame_bars_per_sec', frame_rate)
+    return {'batch': batch_rates, 'streaming': streaming_rates, 'frame': frame_rate}
+
+
+if __name__ == "__main__":
+    print("Starting script...")
+    benchmark()
+    metrics.finish()
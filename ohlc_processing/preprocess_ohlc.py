@@ -1,30 +1,48 @@
 import os
+import sys
 import pandas as pd
 import numpy as np
 from datetime import datetime
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from instrumentation import Instrumentation
+
+metrics = Instrumentation('preprocess_ohlc')
+
+def scale_ohlc_frame(df):
+    """Convert raw OHLC rows (epoch seconds, float prices) to the stock_ticks schema."""
+    # Convert timestamp to datetime
+    df['timestamp'] = pd.to_datetime(df['timestamp'], unit='s')
+    
+    # Scale price columns and convert to integers
+    price_columns = ['open', 'high', 'low', 'close']
+    for col in price_columns:
+        df[col] = np.floor(df[col] * 100).astype(int)
+    
+    # Ensure volume is integer
+    df['volume'] = df['volume'].astype(int)
+    return df
 
 def preprocess_ohlc_data(file_path):
     """Preprocess OHLC data from CSV file and save back to the same file."""
     try:
         # Read CSV file
-        df = pd.read_csv(file_path)
-        
-        # Convert timestamp to datetime
-        df['timestamp'] = pd.to_datetime(df['timestamp'], unit='s')
+        with metrics.span('read'):
+            df = pd.read_csv(file_path)
         
-        # Scale price columns and convert to integers
-        price_columns = ['open', 'high', 'low', 'close']
-        for col in price_columns:
-            df[col] = np.floor(df[col] * 100).astype(int)
-        
-        # Ensure volume is integer
-        df['volume'] = df['volume'].astype(int)
+        with metrics.span('transform'):
+            df = scale_ohlc_frame(df)
         
         # Save back to the same file
-        df.to_csv(file_path, index=False)
+        with metrics.span('write'):
+            df.to_csv(file_path, index=False)
+        metrics.count('rows', len(df))
+        metrics.count('files_processed')
         print(f"Successfully updated {file_path}")
         
     except Exception as e:
+        metrics.count('files_failed')
         print(f"Error preprocessing file {file_path}: {e}")
 
 def process_ohlc_files():
@@ -37,7 +55,10 @@ def process_ohlc_files():
         file_path = os.path.join(ohlc_dir, symbol_dir)
             
         print(f"Processing file: {file_path}")
-        preprocess_ohlc_data(file_path)
+        with metrics.span('file'):
+            preprocess_ohlc_data(file_path)
+
+    metrics.finish()
             
 
 if __name__ == "__main__":
@@ -0,0 +1,474 @@
+import os
+import struct
+import sys
+import zlib
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from indicators import trading_days
+from instrumentation import Instrumentation
+from preprocess_ohlc import scale_ohlc_frame
+
+metrics = Instrumentation('tick_codec')
+
+# Compressed tick segments, one per symbol per trading day, mirroring the
+# timescaledb settings in notes.md (compress_segmentby = 'symbol'). Days are
+# New York trading days (indicators.SESSION_TZ): extended hours run past
+# midnight UTC, so UTC days would split a session. Rows inside a segment are
+# kept in ascending time so the deltas stay small; flip on read for
+# 'time DESC' scans.
+#
+# Segment layout (little endian):
+#   header  <BBIqi flags, len(symbol), n_rows, first timestamp (epoch seconds),
+#                  trading day (days since epoch)
+#   symbol  utf-8 bytes
+#   lengths <8I    byte length of each stream below
+#   streams time_values, time_runs  run-length delta-of-delta timestamps
+#           close                   zigzag-varint delta from previous close
+#           open                    zigzag-varint delta from previous close
+#           high, low               zigzag-varint excess over max/min(open, close)
+#           volume_values, volume_runs  run-length volume with FLAG_VOLUME_RLE,
+#                                       otherwise raw volume and an empty runs stream
+# With FLAG_ZLIB set, everything after the header + symbol is zlib compressed.
+FILE_MAGIC = b'OHLCSEG2'
+FLAG_ZLIB = 0x01
+FLAG_VOLUME_RLE = 0x02
+
+_HEADER = struct.Struct('<BBIqi')
+_LENGTHS = struct.Struct('<8I')
+_SEGMENT_SIZE = struct.Struct('<I')
+
+
+@dataclass
+class Segment:
+    symbol: str
+    timestamp: np.ndarray  # int64 epoch seconds
+    open: np.ndarray       # int64 prices scaled by 100
+    high: np.ndarray
+    low: np.ndarray
+    close: np.ndarray
+    volume: np.ndarray     # int64
+
+    @property
+    def day(self) -> str:
+        return str(trading_days(self.timestamp[:1])[0])
+
+    def __len__(self) -> int:
+        return len(self.timestamp)
+
+
+def zigzag_encode(values: np.ndarray) -> np.ndarray:
+    values = np.asarray(values, dtype=np.int64)
+    return ((values << 1) ^ (values >> 63)).view(np.uint64)
+
+
+def zigzag_decode(values: np.ndarray) -> np.ndarray:
+    values = np.asarray(values, dtype=np.uint64)
+    return (values >> np.uint64(1)).view(np.int64) ^ -(values & np.uint64(1)).view(np.int64)
+
+
+def varint_encode(values: np.ndarray) -> bytes:
+    """LEB128-encodes unsigned integers, one vectorized pass per output byte."""
+    values = np.ascontiguousarray(values, dtype=np.uint64)
+    if len(values) == 0:
+        return b''
+
+    nbytes = np.ones(len(values), dtype=np.int64)
+    for shift in range(7, 64, 7):
+        nbytes += values >= (np.uint64(1) << np.uint64(shift))
+    ends = np.cumsum(nbytes)
+    starts = ends - nbytes
+
+    out = np.empty(ends[-1], dtype=np.uint8)
+    for k in range(int(nbytes.max())):
+        mask = nbytes > k
+        payload = (values[mask] >> np.uint64(7 * k)) & np.uint64(0x7F)
+        more = (nbytes[mask] > k + 1).astype(np.uint64) << np.uint64(7)
+        out[starts[mask] + k] = payload | more
+    return out.tobytes()
+
+
+def varint_decode(buf: bytes) -> np.ndarray:
+    data = np.frombuffer(buf, dtype=np.uint8)
+    if len(data) == 0:
+        return np.empty(0, dtype=np.uint64)
+    if data[-1] & 0x80:
+        raise ValueError("Truncated varint stream")
+
+    # Walk back from each terminating byte, most significant group first.
+    # Minute-bar deltas are mostly 1-2 bytes, so this loop rarely runs long.
+    ends = np.flatnonzero(data < 0x80)
+    values = data[ends].astype(np.uint64)
+    lengths = np.diff(ends, prepend=-1)
+    for k in range(1, int(lengths.max())):
+        mask = lengths > k
+        values[mask] = (values[mask] << np.uint64(7)) | (data[ends[mask] - k] & 0x7F)
+    return values
+
+
+def rle_encode(values: np.ndarray):
+    """Returns (run values, run lengths)."""
+    values = np.asarray(values)
+    if len(values) == 0:
+        return values, np.empty(0, dtype=np.int64)
+    run_starts = np.flatnonzero(np.diff(values)) + 1
+    run_starts = np.concatenate(([0], run_starts))
+    return values[run_starts], np.diff(np.append(run_starts, len(values)))
+
+
+def rle_decode(values: np.ndarray, runs: np.ndarray) -> np.ndarray:
+    return np.repeat(values, runs.astype(np.int64))
+
+
+def encode_segment(segment: Segment, compress: bool = True) -> bytes:
+    """
+    Encodes a single symbol-day segment.
+
+    Args:
+        segment: Rows for one symbol on one day, sorted by ascending timestamp.
+        compress: Run the varint streams through zlib as well. Costs a little
+            decode time for roughly another 25% reduction on minute bars.
+    """
+    n = len(segment)
+    if n == 0:
+        raise ValueError("Cannot encode an empty segment")
+
+    timestamp = np.asarray(segment.timestamp, dtype=np.int64)
+    close = np.asarray(segment.close, dtype=np.int64)
+    open_ = np.asarray(segment.open, dtype=np.int64)
+    high = np.asarray(segment.high, dtype=np.int64)
+    low = np.asarray(segment.low, dtype=np.int64)
+    volume = np.asarray(segment.volume, dtype=np.int64)
+    if (volume < 0).any():
+        raise ValueError(f"Negative volume in segment {segment.symbol} {segment.day}")
+
+    # Delta-of-delta: regular bars collapse into one long run of zeros
+    deltas = np.diff(timestamp)
+    time_values, time_runs = rle_encode(np.diff(deltas, prepend=0))
+
+    previous_close = np.empty_like(close)
+    previous_close[0] = close[0]
+    previous_close[1:] = close[:-1]
+
+    # Liquid symbols rarely repeat a volume, where run lengths only add bytes
+    flags = 0
+    volume_values, volume_runs = rle_encode(volume)
+    volume_streams = [varint_encode(volume_values), varint_encode(volume_runs)]
+    raw_volume = varint_encode(volume)
+    if len(volume_streams[0]) + len(volume_streams[1]) < len(raw_volume):
+        flags |= FLAG_VOLUME_RLE
+    else:
+        volume_streams = [raw_volume, b'']
+
+    streams = [
+        varint_encode(zigzag_encode(time_values)),
+        varint_encode(time_runs),
+        varint_encode(zigzag_encode(np.diff(close, prepend=0))),
+        varint_encode(zigzag_encode(open_ - previous_close)),
+        varint_encode(zigzag_encode(high - np.maximum(open_, close))),
+        varint_encode(zigzag_encode(np.minimum(open_, close) - low)),
+        *volume_streams,
+    ]
+    body = _LENGTHS.pack(*(len(stream) for stream in streams)) + b''.join(streams)
+
+    if compress:
+        body = zlib.compress(body, 6)
+        flags |= FLAG_ZLIB
+
+    symbol = segment.symbol.encode('utf-8')
+    day = int(trading_days(timestamp[:1])[0].astype(np.int64))
+    return _HEADER.pack(flags, len(symbol), n, int(timestamp[0]), day) + symbol + body
+
+
+def _read_header(buf: bytes):
+    flags, symbol_length, n, first_timestamp, day = _HEADER.unpack_from(buf, 0)
+    offset = _HEADER.size
+    symbol = bytes(buf[offset:offset + symbol_length]).decode('utf-8')
+    return flags, symbol, n, first_timestamp, day, offset + symbol_length
+
+
+def decode_segment(buf: bytes) -> Segment:
+    flags, symbol, n, first_timestamp, _, offset = _read_header(buf)
+    body = buf[offset:]
+    if flags & FLAG_ZLIB:
+        body = zlib.decompress(body)
+
+    lengths = _LENGTHS.unpack_from(body, 0)
+    offset = _LENGTHS.size
+    streams = []
+    for length in lengths:
+        streams.append(varint_decode(body[offset:offset + length]))
+        offset += length
+    time_values, time_runs, close, open_, high, low, volume_values, volume_runs = streams
+
+    deltas = np.cumsum(rle_decode(zigzag_decode(time_values), time_runs))
+    timestamp = np.empty(n, dtype=np.int64)
+    timestamp[0] = first_timestamp
+    timestamp[1:] = first_timestamp + np.cumsum(deltas)
+
+    close = np.cumsum(zigzag_decode(close))
+    previous_close = np.empty_like(close)
+    previous_close[0] = close[0]
+    previous_close[1:] = close[:-1]
+    open_ = previous_close + zigzag_decode(open_)
+    high = np.maximum(open_, close) + zigzag_decode(high)
+    low = np.minimum(open_, close) - zigzag_decode(low)
+    if flags & FLAG_VOLUME_RLE:
+        volume_values = rle_decode(volume_values, volume_runs)
+    volume = volume_values.view(np.int64)
+
+    if len(close) != n or len(volume) != n:
+        raise ValueError(f"Corrupt segment {symbol}: expected {n} rows")
+    return Segment(symbol, timestamp, open_, high, low, close, volume)
+
+
+def load_ohlc_frame(file_path: str) -> pd.DataFrame:
+    """
+    Reads an OHLC CSV, raw or already run through preprocess_ohlc_data, and
+    returns it sorted with timestamp as int64 epoch seconds.
+    """
+    df = pd.read_csv(file_path)
+    if pd.api.types.is_numeric_dtype(df['timestamp']):
+        df = scale_ohlc_frame(df)
+    else:
+        df['timestamp'] = pd.to_datetime(df['timestamp'])
+    df['timestamp'] = df['timestamp'].values.astype('datetime64[s]').astype(np.int64)
+    return df.sort_values('timestamp', kind='stable').reset_index(drop=True)
+
+
+def split_segments(df: pd.DataFrame, symbol: str) -> Iterator[Segment]:
+    """Splits a single symbol's frame from load_ohlc_frame into per-trading-day segments."""
+    timestamp = df['timestamp'].to_numpy(dtype=np.int64)
+    columns = {col: df[col].to_numpy(dtype=np.int64) for col in ['open', 'high', 'low', 'close', 'volume']}
+    days = trading_days(timestamp).astype(np.int64)
+    boundaries = np.flatnonzero(np.diff(days)) + 1
+    for rows in np.split(np.arange(len(timestamp)), boundaries):
+        if len(rows) == 0:
+            continue
+        start, stop = rows[0], rows[-1] + 1
+        yield Segment(symbol, timestamp[start:stop],
+                      *(columns[col][start:stop] for col in ['open', 'high', 'low', 'close', 'volume']))
+
+
+def write_segments(file_path: str, segments: Iterator[Segment], compress: bool = True) -> int:
+    """Writes length-prefixed segments to file_path and returns the bytes written."""
+    written = 0
+    with open(file_path, 'wb') as f:
+        f.write(FILE_MAGIC)
+        written += len(FILE_MAGIC)
+        for segment in segments:
+            encoded = encode_segment(segment, compress)
+            f.write(_SEGMENT_SIZE.pack(len(encoded)))
+            f.write(encoded)
+            written += _SEGMENT_SIZE.size + len(encoded)
+            metrics.count('segments_written')
+            metrics.count('rows_written', len(segment))
+    return written
+
+
+def _scan_segments(file_path: str, symbol: Optional[str], start_day: Optional[str],
+                   end_day: Optional[str]) -> Iterator[memoryview]:
+    """Yields the raw segment buffers matching the filters, reading only headers."""
+    start = None if start_day is None else int(np.datetime64(start_day, 'D').astype(np.int64))
+    end = None if end_day is None else int(np.datetime64(end_day, 'D').astype(np.int64))
+
+    with open(file_path, 'rb') as f:
+        data = f.read()
+    if data[:len(FILE_MAGIC)] != FILE_MAGIC:
+        raise ValueError(f"{file_path} is not a tick segment file")
+
+    offset = len(FILE_MAGIC)
+    view = memoryview(data)
+    while offset < len(data):
+        (size,) = _SEGMENT_SIZE.unpack_from(data, offset)
+        offset += _SEGMENT_SIZE.size
+        buf = view[offset:offset + size]
+        offset += size
+
+        _, segment_symbol, _, _, day, _ = _read_header(buf)
+        if symbol is not None and segment_symbol != symbol:
+            continue
+        if start is not None and day < start:
+            continue
+        if end is not None and day > end:
+            continue
+        yield buf
+
+
+def read_segments(file_path: str, symbol: Optional[str] = None,
+                  start_day: Optional[str] = None, end_day: Optional[str] = None) -> Iterator[Segment]:
+    """
+    Yields segments from file_path, optionally restricted to one symbol and
+    an inclusive YYYY-MM-DD trading day range. Filtering only reads segment
+    headers, so skipped segments are never decompressed.
+    """
+    for buf in _scan_segments(file_path, symbol, start_day, end_day):
+        yield decode_segment(buf)
+
+
+def _segmented_cumsum(values: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """Cumulative sum that restarts at every segment boundary."""
+    totals = np.cumsum(values)
+    ends = np.cumsum(lengths)
+    before = np.zeros(len(lengths), dtype=totals.dtype)
+    before[1:] = totals[ends[:-1] - 1] if len(totals) else 0
+    return totals - np.repeat(before, lengths)
+
+
+def decode_segment_batch(buffers: List[bytes]) -> pd.DataFrame:
+    """
+    Decodes many segments at once into the stock_ticks schema.
+
+    Returns the same rows as segments_to_frame([decode_segment(b) for b in
+    buffers]) with symbol as a categorical, but each stream type is
+    varint-decoded in one call across all segments, so the cost per row no
+    longer depends on how short the trading days are.
+    """
+    columns = ['timestamp', 'open', 'high', 'low', 'close', 'volume']
+    if not buffers:
+        return pd.DataFrame(columns=['symbol'] + columns)
+
+    symbols, rows, first_timestamps, volume_rle = [], [], [], []
+    streams = [[] for _ in range(_LENGTHS.size // 4)]
+    for buf in buffers:
+        flags, symbol, n, first_timestamp, _, offset = _read_header(buf)
+        body = buf[offset:]
+        if flags & FLAG_ZLIB:
+            body = zlib.decompress(body)
+        offset = _LENGTHS.size
+        for stream, length in zip(streams, _LENGTHS.unpack_from(body, 0)):
+            stream.append(body[offset:offset + length])
+            offset += length
+        symbols.append(symbol)
+        rows.append(n)
+        first_timestamps.append(first_timestamp)
+        volume_rle.append(bool(flags & FLAG_VOLUME_RLE))
+
+    rows = np.asarray(rows, dtype=np.int64)
+    total = int(rows.sum())
+    segment_starts = np.cumsum(rows) - rows
+    # Volume is split by encoding so each group still decodes in one call
+    volume_streams = streams[6]
+    streams[6] = [stream for stream, rle in zip(volume_streams, volume_rle) if rle]
+    raw_volume = varint_decode(b''.join(stream for stream, rle in zip(volume_streams, volume_rle) if not rle))
+    time_values, time_runs, close, open_, high, low, volume_values, volume_runs = (
+        varint_decode(b''.join(stream)) for stream in streams
+    )
+
+    # Each segment stores n - 1 delta-of-deltas; slot them in after a zero at
+    # the segment start, then integrate twice per segment.
+    dods = np.zeros(total, dtype=np.int64)
+    not_start = np.ones(total, dtype=bool)
+    not_start[segment_starts] = False
+    dods[not_start] = rle_decode(zigzag_decode(time_values), time_runs)
+    deltas = _segmented_cumsum(dods, rows)
+    timestamp = np.repeat(np.asarray(first_timestamps, dtype=np.int64), rows) + _segmented_cumsum(deltas, rows)
+
+    close = _segmented_cumsum(zigzag_decode(close), rows)
+    previous_close = np.empty_like(close)
+    previous_close[0] = close[0]
+    previous_close[1:] = close[:-1]
+    previous_close[segment_starts] = close[segment_starts]
+    open_ = previous_close + zigzag_decode(open_)
+    high = np.maximum(open_, close) + zigzag_decode(high)
+    low = np.minimum(open_, close) - zigzag_decode(low)
+    rle_rows = np.repeat(np.asarray(volume_rle), rows)
+    rle_volume = rle_decode(volume_values, volume_runs)
+    if len(rle_volume) != rle_rows.sum() or len(rle_volume) + len(raw_volume) != total:
+        raise ValueError(f"Corrupt segment batch: expected {total} rows")
+    volume = np.empty(total, dtype=np.int64)
+    volume[rle_rows] = rle_volume.view(np.int64)
+    volume[~rle_rows] = raw_volume.view(np.int64)
+
+    if len(close) != total or len(volume) != total:
+        raise ValueError(f"Corrupt segment batch: expected {total} rows")
+    categories, codes = np.unique(symbols, return_inverse=True)
+    df = pd.DataFrame({
+        'symbol': pd.Categorical.from_codes(np.repeat(codes, rows), categories),
+        'timestamp': pd.to_datetime(timestamp, unit='s'),
+        'open': open_,
+        'high': high,
+        'low': low,
+        'close': close,
+        'volume': volume,
+    })
+    return df
+
+
+def read_frame(file_path: str, symbol: Optional[str] = None,
+               start_day: Optional[str] = None, end_day: Optional[str] = None) -> pd.DataFrame:
+    """Scans file_path like read_segments, batch-decoding the matches into one frame."""
+    return decode_segment_batch(list(_scan_segments(file_path, symbol, start_day, end_day)))
+
+
+def segments_to_frame(segments: List[Segment]) -> pd.DataFrame:
+    """Concatenates decoded segments back into the stock_ticks schema."""
+    columns = ['timestamp', 'open', 'high', 'low', 'close', 'volume']
+    if not segments:
+        return pd.DataFrame(columns=['symbol'] + columns)
+    df = pd.DataFrame({col: np.concatenate([getattr(s, col) for s in segments]) for col in columns})
+    df['timestamp'] = pd.to_datetime(df['timestamp'], unit='s')
+    df.insert(0, 'symbol', np.repeat([s.symbol for s in segments], [len(s) for s in segments]))
+    return df
+
+
+def _preprocessed_csv_size(file_path: str) -> int:
+    """Size of file_path in the text layout preprocess_ohlc_data writes and timescaledb ingests."""
+    df = pd.read_csv(file_path)
+    if not pd.api.types.is_numeric_dtype(df['timestamp']):
+        return os.path.getsize(file_path)
+    return len(scale_ohlc_frame(df).to_csv(index=False).encode('utf-8'))
+
+
+def compress_ohlc_files(symbol: str, ohlc_dir: str = 'test_data/ohlc', output_dir: str = 'test_data/ohlc_segments',
+                        compress: bool = True):
+    """
+    Compresses every OHLC CSV in ohlc_dir into output_dir and verifies the
+    round trip, reporting compression ratio and decode throughput.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+
+    for filename in sorted(os.listdir(ohlc_dir)):
+        file_path = os.path.join(ohlc_dir, filename)
+        output_path = os.path.join(output_dir, f"{filename}.seg")
+        print(f"Compressing file: {file_path}")
+
+        with metrics.span('file'):
+            with metrics.span('load'):
+                df = load_ohlc_frame(file_path)
+            with metrics.span('encode'):
+                compressed_bytes = write_segments(output_path, split_segments(df, symbol), compress)
+            with metrics.span('decode'):
+                decoded = read_frame(output_path)
+
+        csv_bytes = _preprocessed_csv_size(file_path)
+        decoded['timestamp'] = decoded['timestamp'].values.astype('datetime64[s]').astype(np.int64)
+        for col in ['timestamp', 'open', 'high', 'low', 'close', 'volume']:
+            if not np.array_equal(decoded[col].to_numpy(), df[col].to_numpy(dtype=np.int64)):
+                raise ValueError(f"Round trip mismatch in column {col} of {file_path}")
+
+        metrics.count('csv_bytes', csv_bytes)
+        metrics.count('compressed_bytes', compressed_bytes)
+        metrics.count('rows', len(df))
+        metrics.observe('compression_ratio', csv_bytes / compressed_bytes)
+        print(f"{csv_bytes} -> {compressed_bytes} bytes ({csv_bytes / compressed_bytes:.1f}x)")
+
+    report = metrics.report()
+    decode_time = report['spans'].get('file/decode', {}).get('total', 0)
+    if report['counters'].get('compressed_bytes') and decode_time:
+        counters = report['counters']
+        print(f"Overall ratio: {counters['csv_bytes'] / counters['compressed_bytes']:.1f}x")
+        print(f"Decode throughput: {counters['rows'] / decode_time:,.0f} rows/s, "
+              f"{counters['compressed_bytes'] / decode_time / 1e6:.1f} MB/s compressed")
+    metrics.finish()
+
+
+if __name__ == "__main__":
+    print("Starting script...")
+    # The sample files under test_data/ohlc hold a single symbol
+    compress_ohlc_files(sys.argv[1] if len(sys.argv) > 1 else 'AAPL')
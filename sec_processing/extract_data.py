@@ -2,43 +2,128 @@ from llama_cloud_services import LlamaExtract
 import csv
 from pathlib import Path
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import List, Optional
 import os
+import sys
+import tempfile
+import time
 from dotenv import load_dotenv
 from models import SecExtract
-import time
+from section_filter import EpsPayload, build_eps_payload
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from instrumentation import Instrumentation
 
 load_dotenv()
 
+metrics = Instrumentation('extract_data')
+
 # Initialize client
 extractor = LlamaExtract(api_key=os.getenv('LLAMA_CLOUD_API_KEY'))
 sec_agent = extractor.get_agent(name="sec-extractor")
 
+# Set to also extract from the full submission for every filing, measuring the
+# real latency saved by the reduced payload (doubles the remote calls).
+COMPARE_FULL_UPLOAD = os.getenv('SEC_COMPARE_FULL_UPLOAD') == '1'
+
+# Without the comparison, the saving per filing is estimated as bytes cut over
+# the extraction throughput measured on this run's remote calls. This rate is
+# only used when there were none, e.g. every filing parsed locally.
+EXTRACT_BYTES_PER_SEC = float(os.getenv('SEC_EXTRACT_BYTES_PER_SEC', '100000'))
+
+# Bytes kept off the wire for each filing, local parses included
+bytes_cut: List[int] = []
+
+def timed_extract(file_path: str) -> tuple:
+    """Runs the remote extraction and returns (data, seconds)."""
+    start_time = time.perf_counter()
+    extraction_run = sec_agent.extract(str(file_path))
+    return extraction_run.data, time.perf_counter() - start_time
+
+def extract_payload(file_path: str, payload: EpsPayload) -> dict:
+    """Sends the reduced payload, or the original file when nothing was cut."""
+    if payload.text is None:
+        data, elapsed = timed_extract(file_path)
+    else:
+        with tempfile.NamedTemporaryFile('w', suffix='.txt', encoding='utf-8', delete=False) as f:
+            f.write(payload.text)
+        try:
+            data, elapsed = timed_extract(f.name)
+        finally:
+            os.remove(f.name)
+    metrics.observe('extract_latency_sec', elapsed)
+    metrics.count('remote_calls')
+    metrics.count('remote_bytes', payload.bytes_sent)
+    if payload.text is None:
+        metrics.observe('full_extract_latency_sec', elapsed)
+
+    if COMPARE_FULL_UPLOAD and payload.text is not None:
+        _, full_elapsed = timed_extract(file_path)
+        metrics.observe('full_extract_latency_sec', full_elapsed)
+        # Can be negative: a smaller upload is not always a faster extraction
+        metrics.observe('latency_saved_sec', full_elapsed - elapsed)
+        print(f"Latency: {elapsed:.2f}s sent vs {full_elapsed:.2f}s full submission")
+    return data
+
+def record_estimated_savings():
+    """
+    Records latency_saved_estimate_sec for every filing as its bytes cut over
+    the run's measured extraction throughput (EXTRACT_BYTES_PER_SEC when no
+    remote call was made). Run once all files are done so every remote call
+    counts towards the rate; kept apart from the measured latency_saved_sec.
+    """
+    latency = metrics.histograms.get('extract_latency_sec')
+    sent = metrics.counters.get('remote_bytes', 0)
+    if latency is not None and latency.total > 0 and sent:
+        rate, source = sent / latency.total, 'measured'
+    else:
+        rate, source = EXTRACT_BYTES_PER_SEC, 'configured'
+    for cut in bytes_cut:
+        metrics.observe('latency_saved_estimate_sec', cut / rate)
+    if bytes_cut:
+        print(f"Estimated latency saved: {sum(bytes_cut) / rate:.1f}s over {len(bytes_cut)} filings "
+              f"at {rate / 1000:.0f} KB/s ({source})")
+
 def process_file(file_path: str, symbol: str) -> Optional[dict]:
+    # Cut the filing down to the EPS tables before anything goes over the wire.
+    # A filter failure should cost bytes, not the filing, so fall back to a full upload.
     try:
-        start_time = time.time()
-        
+        with metrics.span('prefilter'):
+            payload = build_eps_payload(str(file_path), symbol)
+    except Exception as e:
+        print(f"Prefilter failed for {file_path}, sending full submission: {e}")
+        metrics.count('prefilter_errors')
+        payload = EpsPayload(None, os.path.getsize(file_path), None, 0)
+
+    try:
+        metrics.count('bytes_full', payload.bytes_full)
+        metrics.count('bytes_sent', payload.bytes_sent)
+        bytes_cut.append(payload.bytes_full - payload.bytes_sent)
+        metrics.observe('payload_fraction', payload.bytes_sent / max(payload.bytes_full, 1))
+        print(f"Payload: {payload.bytes_sent} of {payload.bytes_full} bytes "
+              f"({payload.tables_found} EPS tables found)")
+
         # Extract data
-        extraction_start = time.time()
-        extraction_run = sec_agent.extract(str(file_path))
-        result = extraction_run.data
-        extraction_time = time.time() - extraction_start
-        print(f"Data extraction completed (took {extraction_time:.2f}s)")
+        if payload.local_result is not None:
+            result = payload.local_result
+            metrics.count('parsed_locally')
+            print("Data extraction completed locally")
+        else:
+            with metrics.span('extract'):
+                result = extract_payload(file_path, payload)
+            if payload.text is None:
+                metrics.count('prefilter_misses')
+            print("Data extraction completed")
         
         # Process the result
-        processing_start = time.time()
-        new_result = {}
-        for key, value in result.items():
-            if key == 'filing_period':
-                filing_date = datetime.strptime(value, '%Y-%m-%d')
-                start_date = (filing_date - timedelta(days=90)).strftime('%Y-%m-%d')
-                new_result['start_date'] = start_date
-            new_result[key] = value
-        
-        processing_time = time.time() - processing_start
-        total_time = time.time() - start_time
-        print(f"Data processing completed (took {processing_time:.2f}s)")
-        print(f"Total file processing time: {total_time:.2f}s")
+        with metrics.span('postprocess'):
+            new_result = {}
+            for key, value in result.items():
+                if key == 'filing_period':
+                    filing_date = datetime.strptime(value, '%Y-%m-%d')
+                    start_date = (filing_date - timedelta(days=90)).strftime('%Y-%m-%d')
+                    new_result['start_date'] = start_date
+                new_result[key] = value
         
         return new_result
     except Exception as e:
@@ -51,10 +136,7 @@ def store_to_csv(root_dir: str, csv_file: str = "sec_extracts.csv"):
     Traverse directory and process all full-submission.txt files
     Directory structure: /{symbol}/10-Q/{long_string}/full-submission.txt
     """
-    start_time = time.time()
     root_path = Path(root_dir)
-    processed_count = 0
-    error_count = 0
     
     file_exists = os.path.isfile(csv_file)
     
@@ -80,41 +162,35 @@ def store_to_csv(root_dir: str, csv_file: str = "sec_extracts.csv"):
                     if not submission_file.exists():
                         continue
                     
-                    file_start_time = time.time()
                     print(f"\nProcessing: Symbol={symbol}, Filing={filing_dir.name}")
                     
-                    result = process_file(submission_file, symbol)
+                    with metrics.span('file'):
+                        result = process_file(submission_file, symbol)
+                        
+                        if result:
+                            with metrics.span('write'):
+                                if writer is None:
+                                    writer = csv.DictWriter(csvfile, fieldnames=result.keys())
+                                    if not file_exists:
+                                        writer.writeheader()
+                                        file_exists = True
+                                
+                                writer.writerow(result)
                     
                     if result:
-                        if writer is None:
-                            writer = csv.DictWriter(csvfile, fieldnames=result.keys())
-                            if not file_exists:
-                                writer.writeheader()
-                                file_exists = True
-                        
-                        writer.writerow(result)
-                        processed_count += 1
-                        file_elapsed_time = time.time() - file_start_time
+                        metrics.count('files_processed')
                         print(f"✓ Successfully processed {submission_file}")
-                        print(f"Total time for this file (including CSV write): {file_elapsed_time:.2f}s")
                     else:
-                        error_count += 1
+                        metrics.count('files_failed')
                         print(f"✗ Failed to process {submission_file}")
     
     except Exception as e:
         print(f"Error during processing: {e}")
     
     finally:
-        total_time = time.time() - start_time
-        print("\n=== Processing Summary ===")
-        print(f"Total files processed successfully: {processed_count}")
-        print(f"Total files failed: {error_count}")
         print(f"Results saved to: {csv_file}")
-        print(f"Total processing time: {total_time:.2f}s")
-        if processed_count > 0:
-            print(f"Average time per successful file: {(total_time/processed_count):.2f}s")
-        print(f"Started at: {datetime.fromtimestamp(start_time).strftime('%Y-%m-%d %H:%M:%S')}")
-        print(f"Finished at: {datetime.fromtimestamp(time.time()).strftime('%Y-%m-%d %H:%M:%S')}")
+        record_estimated_savings()
+        metrics.finish()
 
 
 if __name__ == "__main__":
@@ -1,10 +1,14 @@
 import re
 import os
+import sys
 from typing import Optional
 import sec_parser as sp
 from pathlib import Path
-import time
-from datetime import datetime, timedelta
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from instrumentation import Instrumentation
+
+metrics = Instrumentation('preprocess_sec')
 
 
 def extract_first_document_html(file_path: str) -> Optional[str]:
@@ -25,16 +29,16 @@ def extract_first_document_html(file_path: str) -> Optional[str]:
         return None
 
     try:
-        start_time = time.time()
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
-        match = re.search(r'<DOCUMENT>(.*?)</DOCUMENT>', content, re.IGNORECASE | re.DOTALL)
-        
+        with metrics.span('extract_html'):
+            with open(file_path, 'r', encoding='utf-8') as f:
+                content = f.read()
+            metrics.count('bytes_read', len(content))
+
+            match = re.search(r'<DOCUMENT>(.*?)</DOCUMENT>', content, re.IGNORECASE | re.DOTALL)
+
         if match:
             extracted_html = match.group(1).strip()
-            elapsed_time = time.time() - start_time
-            print(f"Successfully extracted the first <DOCUMENT> block (took {elapsed_time:.2f}s)")
+            print("Successfully extracted the first <DOCUMENT> block")
             return extracted_html
         else:
             print("Error: Could not find a <DOCUMENT>...</DOCUMENT> block in the file.")
@@ -53,39 +57,52 @@ def overwrite_file_with_content(file_path: str, content: str):
         content: The string content to write into the file.
     """
     try:
-        start_time = time.time()
-        with open(file_path, 'w', encoding='utf-8') as f_out:
-            f_out.write(content)
-        elapsed_time = time.time() - start_time
-        print(f"\nSuccessfully overwrote '{os.path.basename(file_path)}' with extracted content (took {elapsed_time:.2f}s)")
+        with metrics.span('write'):
+            with open(file_path, 'w', encoding='utf-8') as f_out:
+                f_out.write(content)
+        metrics.count('bytes_written', len(content))
+        print(f"\nSuccessfully overwrote '{os.path.basename(file_path)}' with extracted content")
         return True
     except Exception as e:
         print(f"\nError overwriting file {file_path}: {e}")
 
 def parse_sec_content(content: str):
     print('Starting parse...')
-    start_time = time.time()
-    
-    elements = sp.Edgar10QParser().parse(content)
-    parsed_arr = []
+    with metrics.span('parse'):
+        elements = sp.Edgar10QParser().parse(content)
+        parsed_arr = []
 
-    for elem in elements:
-        parsed_arr.append(elem.text + '\n')
+        for elem in elements:
+            parsed_arr.append(elem.text + '\n')
 
-    result = ''.join(parsed_arr)
-    elapsed_time = time.time() - start_time
-    print(f"Parsing completed (took {elapsed_time:.2f}s)")
+        result = ''.join(parsed_arr)
+    metrics.observe('elements_per_filing', len(elements))
+    print("Parsing completed")
     return result
 
+def process_submission(submission_file: Path) -> bool:
+    """Extracts, parses and overwrites a single full-submission.txt file."""
+    # Extract HTML content
+    extracted_content = extract_first_document_html(str(submission_file))
+    if not extracted_content:
+        print(f"✗ Failed to extract HTML from {submission_file}")
+        return False
+
+    # Parse the content
+    parsed_content = parse_sec_content(extracted_content)
+    if not parsed_content:
+        print(f"✗ Failed to parse content from {submission_file}")
+        return False
+
+    # Overwrite the file
+    return bool(overwrite_file_with_content(str(submission_file), parsed_content))
+
 def process_directory(root_dir: str):
     """
     Process all full-submission.txt files in the directory structure
     Directory structure: /{symbol}/10-Q/{long_string}/full-submission.txt
     """
-    start_time = time.time()
     root_path = Path(root_dir)
-    processed_count = 0
-    error_count = 0
     
     try:
         # Traverse directory
@@ -107,44 +124,17 @@ def process_directory(root_dir: str):
                 if not submission_file.exists():
                     continue
                 
-                file_start_time = time.time()
                 print(f"\nProcessing: Symbol={symbol}, Filing={filing_dir.name}")
-                
-                # Extract HTML content
-                extracted_content = extract_first_document_html(str(submission_file))
-                if not extracted_content:
-                    print(f"✗ Failed to extract HTML from {submission_file}")
-                    error_count += 1
-                    continue
-
-                # Parse the content
-                parsed_content = parse_sec_content(extracted_content)
-                if not parsed_content:
-                    print(f"✗ Failed to parse content from {submission_file}")
-                    error_count += 1
-                    continue
+                with metrics.span('file'):
+                    succeeded = process_submission(submission_file)
 
-                # Overwrite the file
-                if overwrite_file_with_content(str(submission_file), parsed_content):
-                    processed_count += 1
-                    file_elapsed_time = time.time() - file_start_time
-                    print(f"Total processing time for this file: {file_elapsed_time:.2f}s")
-                else:
-                    error_count += 1
+                metrics.count('files_processed' if succeeded else 'files_failed')
     
     except Exception as e:
         print(f"Error during directory processing: {e}")
     
     finally:
-        total_time = time.time() - start_time
-        print("\n=== Processing Summary ===")
-        print(f"Total files processed successfully: {processed_count}")
-        print(f"Total files failed: {error_count}")
-        print(f"Total processing time: {total_time:.2f}s")
-        if processed_count > 0:
-            print(f"Average time per successful file: {(total_time/processed_count):.2f}s")
-        print(f"Started at: {datetime.fromtimestamp(start_time).strftime('%Y-%m-%d %H:%M:%S')}")
-        print(f"Finished at: {datetime.fromtimestamp(time.time()).strftime('%Y-%m-%d %H:%M:%S')}")
+        metrics.finish()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,263 @@
+import re
+from dataclasses import dataclass
+from datetime import datetime
+from typing import List, Optional
+
+import sec_parser as sp
+
+from models import SecExtract
+
+# Only the EPS figures in models.SecExtract are extracted, and those live in
+# the income statement / EPS note tables. Everything else in the filing is
+# upload time, latency and cost, so this module cuts each filing down to:
+#   - a short cover excerpt (company, period) so the LLM can still fill symbol
+#     and filing_period
+#   - the tables mentioning earnings per share, as markdown, with their
+#     section titles and neighbouring text
+# and, when an EPS table is in a layout we recognise, parses it locally so
+# the remote call can be skipped entirely.
+
+MAX_TABLES = 3
+COVER_CHARS = 2000
+CONTEXT_CHARS = 600
+# Plain-text fallback for files preprocess_sec.py has already overwritten
+CONTEXT_LINES_BEFORE = 40
+CONTEXT_LINES_AFTER = 10
+
+_DECIMAL = re.compile(r'(\()?\s*\$?\s*(\d[\d,]*\.\d+)\s*(\))?')
+_YEAR = re.compile(r'\b(?:19|20)\d{2}\b')
+_PERIOD_HEADER = re.compile(r'CONFORMED PERIOD OF REPORT:\s*(\d{8})')
+# pandas names blank <th> cells "Unnamed: N"; separator rows are all dashes
+_BLANK_LABEL = re.compile(r'unnamed: \d+|-*')
+_PERIOD_COVER = re.compile(r'quarterly\s+period\s+ended:?\s+([A-Z][a-z]+\.?\s+\d{1,2},?\s+\d{4})', re.IGNORECASE)
+
+
+@dataclass
+class EpsPayload:
+    text: Optional[str]            # reduced payload, None to send the original file
+    bytes_full: int
+    local_result: Optional[dict]   # SecExtract fields when parsed locally
+    tables_found: int
+
+    @property
+    def bytes_sent(self) -> int:
+        if self.local_result is not None:
+            return 0
+        if self.text is None:
+            return self.bytes_full
+        return len(self.text.encode('utf-8'))
+
+
+def _find_period(content: str) -> Optional[str]:
+    """Quarter end date as YYYY-MM-DD from the SEC header or the cover page."""
+    match = _PERIOD_HEADER.search(content)
+    if match:
+        return datetime.strptime(match.group(1), '%Y%m%d').strftime('%Y-%m-%d')
+    match = _PERIOD_COVER.search(content)
+    if match:
+        raw = re.sub(r'[.,]', '', match.group(1))
+        for fmt in ('%B %d %Y', '%b %d %Y'):
+            try:
+                return datetime.strptime(raw, fmt).strftime('%Y-%m-%d')
+            except ValueError:
+                continue
+    return None
+
+
+def _is_eps_table(text: str) -> bool:
+    text = text.lower()
+    return 'per share' in text and ('basic' in text or 'diluted' in text)
+
+
+def _score_table(text: str) -> int:
+    text = text.lower()
+    keywords = ['per share', 'basic', 'diluted', 'three months', 'net income', 'net loss', 'earnings']
+    return sum(keyword in text for keyword in keywords)
+
+
+def _column_years(rows: List[List[str]], n_values: int) -> Optional[List[int]]:
+    """Years of the value columns, from the first heading row holding one year in each."""
+    for cells in rows:
+        columns = [cell for cell in cells[1:] if cell]
+        years = [_YEAR.findall(cell) for cell in columns]
+        if len(columns) == n_values and all(len(found) == 1 for found in years) \
+                and not any(_DECIMAL.search(cell) for cell in columns):
+            return [int(found[0]) for found in years]
+    return None
+
+
+def _parse_eps_rows(markdown: str) -> Optional[dict]:
+    """
+    Reads EPS values out of a markdown table in the usual income statement
+    layout: one "Basic" and one "Diluted" row holding [3m current, 3m prior]
+    or [3m current, 3m prior, 6/9m current, 6/9m prior]. Returns None for
+    anything less clear-cut (multiple share classes, continuing vs net EPS,
+    unexpected column counts, or column years that do not show which
+    column is the current period) so the LLM handles it instead.
+    """
+    # Everything above the first EPS row counts as column headings, including
+    # rows with a stub label such as "(in millions, except per share data)"
+    leading = []
+    basic, diluted = [], []
+    for line in markdown.splitlines():
+        cells = [cell.strip() for cell in line.strip().strip('|').split('|')]
+        label = cells[0].lower()
+        if _BLANK_LABEL.fullmatch(label):
+            label = ''
+        values = [('-' if opening and closing else '') + number.replace(',', '')
+                  for opening, number, closing in _DECIMAL.findall(' '.join(cells[1:]))]
+        if values and 'basic' in label and 'diluted' not in label:
+            basic.append(values)
+        elif values and 'diluted' in label:
+            diluted.append(values)
+        elif not basic and not diluted:
+            leading.append(cells)
+
+    if len(basic) != 1 or len(diluted) != 1 or len(basic[0]) != len(diluted[0]):
+        return None
+
+    header = ' '.join(' '.join(cells) for cells in leading).lower()
+    if 'three months' not in header:
+        return None
+    n_values = len(basic[0])
+    if n_values == 2:
+        periods = 1
+    elif n_values == 4 and ('six months' in header or 'nine months' in header):
+        periods = 2
+    else:
+        return None
+
+    # Current year first is the norm but not universal, so only parse when a
+    # heading row gives one year per value column and the order is consistent
+    years = _column_years(leading, n_values)
+    if years is None:
+        return None
+    pairs = [years[i:i + 2] for i in range(0, n_values, 2)]
+    if any(pair[0] == pair[1] for pair in pairs):
+        return None
+    current_first = pairs[0][0] > pairs[0][1]
+    if any((pair[0] > pair[1]) != current_first for pair in pairs):
+        return None
+
+    def current(values: List[str], period: int) -> str:
+        return values[2 * period] if current_first else values[2 * period + 1]
+
+    result = {
+        'eps_basic': current(basic[0], 0),
+        'eps_diluted': current(diluted[0], 0),
+        'eps_basic9': None,
+        'eps_diluted9': None,
+    }
+    if periods == 2 and 'nine months' in header:
+        result['eps_basic9'] = current(basic[0], 1)
+        result['eps_diluted9'] = current(diluted[0], 1)
+    return result
+
+
+def _table_markdown(table: sp.TableElement) -> str:
+    """Markdown for the table, or its plain text when sec_parser cannot convert it."""
+    try:
+        return table.table_to_markdown()
+    except (AttributeError, ValueError):
+        # e.g. multi-row <th> headers, which pandas reads as tuple column names
+        return table.text
+
+
+def _reduce_html(html: str, symbol: str, period: Optional[str], bytes_full: int) -> EpsPayload:
+    elements = sp.Edgar10QParser().parse(html)
+    tree = sp.TreeBuilder().build(elements)
+
+    candidates = [node for node in tree.nodes
+                  if isinstance(node.semantic_element, sp.TableElement) and _is_eps_table(node.text)]
+    if not candidates:
+        return EpsPayload(None, bytes_full, None, 0)
+
+    ranked = sorted(candidates, key=lambda node: _score_table(node.text), reverse=True)[:MAX_TABLES]
+
+    # Parse locally only when the best table is unambiguous on its own
+    local = _parse_eps_rows(_table_markdown(ranked[0].semantic_element)) if period else None
+    if local is not None:
+        local_result = SecExtract(symbol=symbol, filing_period=period, **local).model_dump()
+        return EpsPayload(None, bytes_full, local_result, len(candidates))
+
+    cover = []
+    for element in elements:
+        if isinstance(element, sp.TopSectionTitle):
+            break
+        cover.append(element.text)
+    parts = [f"Symbol: {symbol}"]
+    if period:
+        parts.append(f"Period of report: {period}")
+    parts.append('\n'.join(cover)[:COVER_CHARS])
+
+    # Keep document order so statement tables precede the EPS note
+    order = {id(node): i for i, node in enumerate(tree.nodes)}
+    for node in sorted(ranked, key=lambda node: order[id(node)]):
+        titles = []
+        parent = node.parent
+        while parent is not None:
+            titles.append(parent.text)
+            parent = parent.parent
+        siblings = node.parent.children if node.parent is not None else []
+        index = siblings.index(node) if node in siblings else -1
+        before = siblings[index - 1].text[-CONTEXT_CHARS:] if index > 0 else ''
+        after = siblings[index + 1].text[:CONTEXT_CHARS] if 0 <= index < len(siblings) - 1 else ''
+
+        parts.append('\n'.join([
+            ' > '.join(reversed(titles)),
+            before,
+            _table_markdown(node.semantic_element),
+            after,
+        ]))
+
+    return EpsPayload('\n\n'.join(part for part in parts if part), bytes_full, None, len(candidates))
+
+
+def _reduce_text(content: str, symbol: str, period: Optional[str], bytes_full: int) -> EpsPayload:
+    """Line-window fallback for filings already flattened to text by preprocess_sec.py."""
+    lines = content.splitlines()
+    keep = set()
+    last_per_share = None
+    for i, line in enumerate(lines):
+        lowered = line.lower()
+        if 'per share' in lowered:
+            last_per_share = i
+        if last_per_share is not None and i - last_per_share <= 5 and ('basic' in lowered or 'diluted' in lowered):
+            keep.update(range(max(0, i - CONTEXT_LINES_BEFORE), min(len(lines), i + CONTEXT_LINES_AFTER + 1)))
+
+    if not keep:
+        return EpsPayload(None, bytes_full, None, 0)
+    # Overlapping windows are one table; count the separate stretches kept
+    kept = sorted(keep)
+    tables_found = 1 + sum(after - before > 1 for before, after in zip(kept, kept[1:]))
+
+    parts = [f"Symbol: {symbol}"]
+    if period:
+        parts.append(f"Period of report: {period}")
+    parts.append(content[:COVER_CHARS])
+    parts.append('\n'.join(lines[i] for i in sorted(keep)))
+    return EpsPayload('\n\n'.join(parts), bytes_full, None, tables_found)
+
+
+def build_eps_payload(file_path: str, symbol: str) -> EpsPayload:
+    """
+    Cuts a full-submission.txt down to the EPS tables and surrounding text,
+    or parses them outright when the layout is recognised.
+
+    Args:
+        file_path: Raw EDGAR submission, or one already flattened by preprocess_sec.py.
+        symbol: Ticker taken from the directory layout.
+
+    Returns:
+        EpsPayload whose text is the full file when no EPS table was found.
+    """
+    with open(file_path, 'r', encoding='utf-8') as f:
+        content = f.read()
+    bytes_full = len(content.encode('utf-8'))
+    period = _find_period(content)
+
+    match = re.search(r'<DOCUMENT>(.*?)</DOCUMENT>', content, re.IGNORECASE | re.DOTALL)
+    if match:
+        return _reduce_html(match.group(1), symbol, period, bytes_full)
+    return _reduce_text(content, symbol, period, bytes_full)
+
@@ -0,0 +1,80 @@
+import pytest
+
+from section_filter import _parse_eps_rows, _reduce_text
+
+# Tables as sec_parser's table_to_markdown renders them
+CASES = {
+    'three and nine months, current year first': ("""
+| | Three Months Ended | | Nine Months Ended | |
+| | 2024 | 2023 | 2024 | 2023 |
+| Earnings per share: | | | | |
+| Basic | $ 1.53 | $ 1.27 | $ 4.62 | $ 4.06 |
+| Diluted | $ 1.52 | $ 1.26 | $ 4.60 | $ 4.04 |""", {'eps_basic': '1.53', 'eps_diluted': '1.52', 'eps_basic9': '4.62', 'eps_diluted9': '4.60'}),
+    '<th> headers': ("""
+| Unnamed: 0 | Three Months Ended September 30, | Three Months Ended September 30,.1 |
+|---|---|---|
+| | 2023 | 2022 |
+| Net income per share: | | |
+| Basic | $ 1.46 | $ 1.20 |
+| Diluted | $ 1.45 | $ 1.19 |""", {'eps_basic': '1.46', 'eps_diluted': '1.45', 'eps_basic9': None, 'eps_diluted9': None}),
+    'current year second': ("""
+| | | Three Months Ended June 30, |
+| | 2022 | 2023 |
+| Basic | $ 0.88 | $ 0.91 |
+| Diluted | $ 0.87 | $ 0.90 |""", {'eps_basic': '0.91', 'eps_diluted': '0.90', 'eps_basic9': None, 'eps_diluted9': None}),
+    'stub label on the years row, current year second': ("""
+| | Three Months Ended September 30, | |
+| (in millions, except per share data) | 2018 | 2019 |
+| Net income | $ 2,500 | $ 2,400 |
+| Basic | $ 5.21 | $ 5.32 |
+| Diluted | $ 5.07 | $ 5.22 |""", {'eps_basic': '5.32', 'eps_diluted': '5.22', 'eps_basic9': None, 'eps_diluted9': None}),
+    'years in the period headings': ("""
+| | Three Months Ended | |
+| | September 28, 2019 | September 29, 2018 |
+| Basic | $ 3.05 | $ 2.94 |
+| Diluted | $ 3.03 | $ 2.91 |""", {'eps_basic': '3.05', 'eps_diluted': '3.03', 'eps_basic9': None, 'eps_diluted9': None}),
+    'parenthesised negatives': ("""
+| | Three Months Ended March 31, | |
+| | 2024 | 2023 |
+| Net loss per share, basic | $ (0.31) | $ 0.12 |
+| Net loss per share, diluted | $ (0.31) | $ 0.11 |""", {'eps_basic': '-0.31', 'eps_diluted': '-0.31', 'eps_basic9': None, 'eps_diluted9': None}),
+    'six month columns leave the nine month fields empty': ("""
+| | Three Months Ended | | Six Months Ended | |
+| | 2024 | 2023 | 2024 | 2023 |
+| Basic | $ 2.10 | $ 1.90 | $ 4.00 | $ 3.70 |
+| Diluted | $ 2.08 | $ 1.88 | $ 3.96 | $ 3.66 |""", {'eps_basic': '2.10', 'eps_diluted': '2.08', 'eps_basic9': None, 'eps_diluted9': None}),
+    'two Basic rows are left to the LLM': ("""
+| | Three Months Ended | |
+| | 2024 | 2023 |
+| Class A common stock | | |
+| Basic | $ 1.10 | $ 0.95 |
+| Diluted | $ 1.09 | $ 0.94 |
+| Class B common stock | | |
+| Basic | $ 11.00 | $ 9.50 |
+| Diluted | $ 10.90 | $ 9.40 |""", None),
+    'no column years are left to the LLM': ("""
+| | Three Months Ended | |
+| | Current | Prior |
+| Basic | $ 5.21 | $ 5.32 |
+| Diluted | $ 5.07 | $ 5.22 |""", None),
+    'mixed year order is left to the LLM': ("""
+| | Three Months Ended | | Nine Months Ended | |
+| | 2024 | 2023 | 2023 | 2024 |
+| Basic | $ 1.53 | $ 1.27 | $ 4.06 | $ 4.62 |
+| Diluted | $ 1.52 | $ 1.26 | $ 4.04 | $ 4.60 |""", None),
+}
+
+
+@pytest.mark.parametrize('markdown, expected', CASES.values(), ids=CASES.keys())
+def test_parse_eps_rows(markdown, expected):
+    assert _parse_eps_rows(markdown.strip()) == expected
+
+
+def test_reduce_text_counts_windows_not_lines():
+    filler = ['Lorem ipsum'] * 200
+    table = ['Net income per share:', 'Basic 1.00 0.90', 'Diluted 0.99 0.89']
+    content = '\n'.join(filler + table + filler + table + filler)
+
+    payload = _reduce_text(content, 'TEST', None, len(content))
+
+    assert payload.tables_found == 2